@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Fake Azure AI Foundry images service for offline load and regression testing
+
+Implements /openai/deployments/{name}/images/generations and
+/openai/deployments/{name}/images/edits with the same response shape as
+Azure (data[i].b64_json), plus configurable latency, 429/5xx injection
+and Retry-After headers.
+
+Run as a subprocess:
+    python benchmarks/fake_azure.py --port 9000 --latency lognormal:2,0.5 --rate-429 0.05
+
+Or in-process:
+    fake = FakeAzure(latency="fixed:0.1")
+    transport = httpx.ASGITransport(app=fake.app)      # no sockets
+    async with fake.serve(port=0) as base_url: ...     # real HTTP on a free port
+
+Point the MCP server at it with AZURE_BASE_URL=http://127.0.0.1:9000 and
+any AZURE_API_KEY / AZURE_DEPLOYMENT_NAME.
+"""
+
+import argparse
+import asyncio
+import base64
+import importlib.util
+import io
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    from PIL import Image
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+    import uvicorn
+except ImportError as e:
+    print(f"Error: Required dependency missing: {e}", file=sys.stderr)
+    print("Please install required packages: pip install pillow starlette uvicorn python-multipart", file=sys.stderr)
+    sys.exit(1)
+
+# Starlette parses the edits form with python-multipart, importable as
+# python_multipart since 0.0.13 and as multipart before that
+if importlib.util.find_spec("python_multipart") is None and importlib.util.find_spec("multipart") is None:
+    print("Error: Required dependency missing: python-multipart", file=sys.stderr)
+    print("Please install required packages: pip install pillow starlette uvicorn python-multipart", file=sys.stderr)
+    sys.exit(1)
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Build a latency sampler in seconds from a spec
+
+    fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA,
+    exponential:MEAN
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(v) for v in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential" and len(values) == 1:
+        return lambda: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+class FakeAzure:
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+        retry_after: Optional[float] = 1.0,
+        retry_after_ms: bool = False,
+        noise_images: bool = True,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency: Latency spec for successful responses, see parse_latency
+            rate_429: Fraction of requests answered with 429 Too Many Requests
+            rate_5xx: Fraction of requests answered with a random 500/502/503
+            retry_after: Retry-After seconds sent with 429/503, None to omit
+            retry_after_ms: Send retry-after-ms instead of Retry-After
+            noise_images: Return random-noise PNGs (realistic multi-MB payloads) instead of solid color
+            seed: Random seed for reproducible runs
+        """
+        self.rng = random.Random(seed)
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency, self.rng)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.retry_after_ms = retry_after_ms
+        self.noise_images = noise_images
+
+        self._images: dict[tuple[int, int], str] = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.responses: dict[int, int] = {}
+        # Headers of the most recent request, for tests checking what the client sent
+        self.last_request_headers: dict[str, str] = {}
+
+        self.app = Starlette(routes=[
+            Route("/openai/deployments/{deployment}/images/generations", self.handle_generations, methods=["POST"]),
+            Route("/openai/deployments/{deployment}/images/edits", self.handle_edits, methods=["POST"]),
+            Route("/_fake/stats", self.handle_stats, methods=["GET"]),
+        ])
+
+    def image_b64(self, width: int, height: int) -> str:
+        """Base64 PNG of the given size, generated once per size"""
+        key = (width, height)
+        if key not in self._images:
+            if self.noise_images:
+                image = Image.frombytes("RGB", key, os.urandom(width * height * 3))
+            else:
+                image = Image.new("RGB", key, (120, 160, 200))
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            self._images[key] = base64.b64encode(buffer.getvalue()).decode("ascii")
+        return self._images[key]
+
+    def _respond(self, status: int, body: dict[str, Any]) -> JSONResponse:
+        self.responses[status] = self.responses.get(status, 0) + 1
+        headers = {"apim-request-id": f"fake-{self.requests}"}
+        if status in (429, 503) and self.retry_after is not None:
+            if self.retry_after_ms:
+                headers["retry-after-ms"] = str(int(self.retry_after * 1000))
+            else:
+                headers["Retry-After"] = str(int(math.ceil(self.retry_after)))
+        return JSONResponse(body, status_code=status, headers=headers)
+
+    def _error(self, status: int, code: str, message: str) -> JSONResponse:
+        return self._respond(status, {"error": {"code": code, "message": message}})
+
+    def _injected_fault(self) -> Optional[JSONResponse]:
+        roll = self.rng.random()
+        if roll < self.rate_429:
+            return self._error(429, "TooManyRequests", "Rate limit exceeded, retry later")
+        if roll < self.rate_429 + self.rate_5xx:
+            status = self.rng.choice((500, 502, 503))
+            return self._error(status, "InternalServerError", "Injected server error")
+        return None
+
+    async def _handle(self, request: Request, parse: Callable) -> JSONResponse:
+        self.requests += 1
+        self.last_request_headers = dict(request.headers)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if not request.headers.get("authorization") and not request.headers.get("api-key"):
+                return self._error(401, "Unauthorized", "Missing API key")
+            fault = self._injected_fault()
+            if fault is not None:
+                return fault
+            try:
+                prompt, size, n = await parse(request)
+                width, height = parse_size(size)
+            except Exception as e:
+                return self._error(400, "BadRequest", f"Invalid request: {e}")
+            if not prompt:
+                return self._error(400, "BadRequest", "prompt is required")
+
+            await asyncio.sleep(self.sample_latency())
+            image = self.image_b64(width, height)
+            return self._respond(200, {
+                "created": int(time.time()),
+                "data": [{"b64_json": image} for _ in range(max(1, n))]
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def handle_generations(self, request: Request) -> JSONResponse:
+        async def parse(request: Request):
+            body = await request.json()
+            return body.get("prompt"), body.get("size", "1024x1024"), int(body.get("n", 1))
+        return await self._handle(request, parse)
+
+    async def handle_edits(self, request: Request) -> JSONResponse:
+        async def parse(request: Request):
+            form = await request.form()
+            upload = form.get("image")
+            if upload is None:
+                raise ValueError("image is required")
+            image_bytes = await upload.read()
+            size = form.get("size")
+            if not size:
+                with Image.open(io.BytesIO(image_bytes)) as img:
+                    size = f"{img.size[0]}x{img.size[1]}"
+            return form.get("prompt"), size, 1
+        return await self._handle(request, parse)
+
+    async def handle_stats(self, request: Request) -> JSONResponse:
+        return JSONResponse(self.stats())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+        }
+
+    @asynccontextmanager
+    async def serve(self, host: str = "127.0.0.1", port: int = 0):
+        """Serve over real HTTP in the current event loop, yielding the base URL"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        server = uvicorn.Server(uvicorn.Config(self.app, log_level="warning", access_log=False))
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.01)
+        try:
+            yield f"http://{host}:{sock.getsockname()[1]}"
+        finally:
+            server.should_exit = True
+            await task
+            sock.close()
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def run_subprocess(port: Optional[int] = None, args: Optional[list[str]] = None, startup_timeout: float = 10.0) -> Iterator[str]:
+    """Run the fake service in a child process, yielding its base URL"""
+    import httpx
+
+    port = port or free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--port", str(port), *(args or [])],
+        stdout=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                httpx.get(f"{base_url}/_fake/stats", timeout=1.0)
+                break
+            except httpx.TransportError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Fake Azure service did not start")
+                time.sleep(0.05)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Azure images service for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S, uniform:LOW,HIGH, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fraction of requests answered with 500/502/503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429/503, negative to omit")
+    parser.add_argument("--retry-after-ms", action="store_true", help="Send retry-after-ms instead of Retry-After")
+    parser.add_argument("--solid-images", action="store_true", help="Return small solid-color PNGs instead of noise")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeAzure(
+        latency=args.latency,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after if args.retry_after >= 0 else None,
+        retry_after_ms=args.retry_after_ms,
+        noise_images=not args.solid_images,
+        seed=args.seed
+    )
+    print(f"Fake Azure images service on http://{args.host}:{args.port} (latency {args.latency})", file=sys.stderr)
+    uvicorn.run(fake.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
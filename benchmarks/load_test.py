@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Open-loop load test for the HTTP MCP server
+
+Sends tools/call requests at Poisson-distributed arrival times, so the
+offered load does not drop when the server slows down. Latency is measured
+from each request's scheduled start (coordinated-omission corrected), and
+from its actual send time as service time.
+
+By default it starts the fake Azure service and mcp_server_http.py as
+subprocesses and measures the server's RSS and CPU time:
+    python benchmarks/load_test.py --rate 20 --duration 60 --mix generate=0.8,edit=0.2
+
+Options for the fake service go last, after --fake-args:
+    python benchmarks/load_test.py --rate 20 --fake-args --rate-429 0.05 --solid-images
+
+Or drive a server that is already running:
+    python benchmarks/load_test.py --url http://127.0.0.1:8000/ --server-pid 1234
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import platform
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import httpx
+    from PIL import Image
+except ImportError as e:
+    print(f"Error: Required dependency missing: {e}", file=sys.stderr)
+    print("Please install required packages: pip install httpx pillow", file=sys.stderr)
+    sys.exit(1)
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_azure import free_port, run_subprocess
+
+SERVER_SCRIPT = Path(__file__).parent.parent / "src" / "mcp_server_http.py"
+
+PROMPT_WORDS = (
+    "a detailed watercolor painting of a lighthouse on a rocky coast at sunset with seagulls "
+    "and crashing waves, warm golden light, soft clouds, high detail, cinematic composition"
+).split()
+
+
+def poisson_schedule(rate: float, duration: float, rng: random.Random) -> list[float]:
+    """Arrival offsets in seconds for a Poisson process of the given rate"""
+    offsets = []
+    t = rng.expovariate(rate)
+    while t < duration:
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("generate", "edit"):
+            raise argparse.ArgumentTypeError(f"Unknown operation in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def make_prompt(rng: random.Random, index: int) -> str:
+    """A realistic-length prompt, unique per request so caching and coalescing do not hide work"""
+    words = rng.sample(PROMPT_WORDS, k=len(PROMPT_WORDS) // 2)
+    return f"{' '.join(words)}, variation {index}"
+
+
+def make_edit_image_b64(size: str) -> str:
+    """A random-noise PNG, about as large as a real photo of that size"""
+    width, height = (int(v) for v in size.split("x"))
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class RequestFactory:
+    """Builds JSON-RPC request bodies, reusing the encoded edit image"""
+
+    def __init__(self, size: str, edit_image_b64: Optional[str]):
+        self.size = size
+        if edit_image_b64 is not None:
+            self._edit_prefix = (
+                '{"jsonrpc":"2.0","method":"tools/call","params":{"name":"edit_image","arguments":'
+                '{"image_data_base64":"' + edit_image_b64 + '","prompt":'
+            ).encode()
+
+    def build(self, operation: str, request_id: int, prompt: str) -> bytes:
+        if operation == "edit":
+            return self._edit_prefix + f'{json.dumps(prompt)}}}}},"id":{request_id}}}'.encode()
+        return json.dumps({
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "tools/call",
+            "params": {"name": "generate_image", "arguments": {"prompt": prompt, "size": self.size}}
+        }).encode()
+
+
+# Content types that carry a result image: inline, embedded, or linked (IMAGE_DELIVERY=url/resource)
+IMAGE_CONTENT_TYPES = ("image", "resource", "resource_link")
+IMAGE_CONTENT_MARKERS = tuple(f'"type":"{content_type}"'.encode() for content_type in IMAGE_CONTENT_TYPES)
+
+
+def classify(response: httpx.Response) -> str:
+    """ok, or the kind of failure"""
+    if response.status_code != 200:
+        return f"http_{response.status_code}"
+    # Avoid parsing multi-megabyte successful responses
+    if any(marker in response.content for marker in IMAGE_CONTENT_MARKERS):
+        return "ok"
+    try:
+        body = response.json()
+    except ValueError:
+        return "invalid_json"
+    if "error" in body:
+        return f"rpc_{body['error'].get('code')}"
+    content = body.get("result", {}).get("content", [])
+    if any(part.get("type") in IMAGE_CONTENT_TYPES for part in content):
+        return "ok"
+    return "tool_error"
+
+
+class ProcessSampler:
+    """Samples RSS and CPU time of a process from /proc (Linux only)"""
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.available = pid is not None and os.path.exists(f"/proc/{pid}/stat")
+        self.rss_samples: list[int] = []
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def cpu_seconds(self) -> Optional[float]:
+        if not self.available:
+            return None
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def rss_bytes(self) -> Optional[int]:
+        if not self.available:
+            return None
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return None
+
+    async def run(self, interval: float = 0.25):
+        while self.available:
+            rss = self.rss_bytes()
+            if rss is not None:
+                self.rss_samples.append(rss)
+            await asyncio.sleep(interval)
+
+
+def percentile(sorted_values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(values: list[float]) -> dict[str, Optional[float]]:
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "p999": percentile(values, 99.9),
+        "max": values[-1] if values else None,
+        "mean": sum(values) / len(values) if values else None,
+    }
+
+
+async def run_load(
+    url: str,
+    schedule: list[float],
+    operations: list[str],
+    prompts: list[str],
+    factory: RequestFactory,
+    timeout: float,
+    concurrency_limit: int
+) -> tuple[list[dict[str, Any]], float]:
+    """Fire one request per scheduled offset without waiting for earlier ones"""
+    limits = httpx.Limits(max_connections=concurrency_limit, max_keepalive_connections=concurrency_limit)
+    results: list[dict[str, Any]] = []
+    max_lag = 0.0
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def fire(index: int, intended: float):
+            operation = operations[index]
+            body = factory.build(operation, index, prompts[index])
+            sent = time.perf_counter()
+            try:
+                response = await client.post(url, content=body, headers={"Content-Type": "application/json"})
+                outcome = classify(response)
+            except httpx.TimeoutException:
+                outcome = "timeout"
+            except httpx.TransportError as e:
+                outcome = type(e).__name__
+            done = time.perf_counter()
+            results.append({
+                "operation": operation,
+                "outcome": outcome,
+                "latency": done - intended,
+                "service_time": done - sent,
+                "finished": done,
+            })
+
+        tasks = []
+        start = time.perf_counter()
+        for index, offset in enumerate(schedule):
+            intended = start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            max_lag = max(max_lag, time.perf_counter() - intended)
+            tasks.append(asyncio.create_task(fire(index, intended)))
+        await asyncio.gather(*tasks)
+    return results, max_lag
+
+
+def summarize(
+    results: list[dict[str, Any]],
+    duration: float,
+    elapsed: float,
+    sampler: ProcessSampler,
+    cpu_used: Optional[float]
+) -> dict[str, Any]:
+    ok = [r for r in results if r["outcome"] == "ok"]
+    outcomes: dict[str, int] = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+
+    summary: dict[str, Any] = {
+        "requests": len(results),
+        "offered_rate": len(results) / duration if duration else None,
+        "throughput": len(ok) / elapsed if elapsed else None,
+        "elapsed_seconds": elapsed,
+        "outcomes": outcomes,
+        "latency": latency_summary([r["latency"] for r in ok]),
+        "service_time": latency_summary([r["service_time"] for r in ok]),
+        "by_operation": {
+            operation: latency_summary([r["latency"] for r in ok if r["operation"] == operation])
+            for operation in sorted(set(r["operation"] for r in results))
+        },
+    }
+    if sampler.available:
+        summary["server"] = {
+            "cpu_seconds": cpu_used,
+            "cpu_ms_per_request": cpu_used * 1000 / len(results) if cpu_used is not None and results else None,
+            "rss_peak_mb": max(sampler.rss_samples) / 2**20 if sampler.rss_samples else None,
+            "rss_end_mb": sampler.rss_samples[-1] / 2**20 if sampler.rss_samples else None,
+        }
+    return summary
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+
+def print_report(summary: dict[str, Any]):
+    print(f"Requests:    {summary['requests']} ({summary['offered_rate']:.2f}/s offered)")
+    print(f"Throughput:  {summary['throughput']:.2f} ok/s over {summary['elapsed_seconds']:.1f}s")
+    print(f"Outcomes:    {', '.join(f'{k}={v}' for k, v in sorted(summary['outcomes'].items()))}")
+    for title, key in (("Latency (corrected)", "latency"), ("Service time", "service_time")):
+        stats = summary[key]
+        print(f"{title + ':':<21}" + "  ".join(f"{name}={format_seconds(stats[name])}" for name in ("p50", "p95", "p99", "p999", "max")))
+    for operation, stats in summary["by_operation"].items():
+        print(f"  {operation:<19}" + "  ".join(f"{name}={format_seconds(stats[name])}" for name in ("p50", "p95", "p99", "p999")))
+    server = summary.get("server")
+    if server:
+        print(
+            f"Server:      {server['cpu_ms_per_request']:.2f} ms CPU/request, "
+            f"RSS peak {server['rss_peak_mb']:.1f} MB, end {server['rss_end_mb']:.1f} MB"
+        )
+    print(f"Generator:   max dispatch lag {format_seconds(summary['max_dispatch_lag'])}")
+
+
+def start_server(fake_url: str, port: int, extra_env: dict[str, str], log_dir: Path) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "AZURE_BASE_URL": fake_url,
+        "AZURE_API_KEY": "fake-azure-api-key",
+        "AZURE_DEPLOYMENT_NAME": "fake-deployment",
+        "MCP_SERVER_HOST": "127.0.0.1",
+        "MCP_SERVER_PORT": str(port),
+        **extra_env,
+    }
+    env.pop("AZURE_ENDPOINTS", None)
+    return subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT)],
+        env=env,
+        cwd=str(log_dir),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+def wait_for_health(base_url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if process.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("MCP server did not start, see its logs")
+        time.sleep(0.1)
+
+
+async def run_benchmark(args, url: str, server_pid: Optional[int]) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    schedule = poisson_schedule(args.rate, args.duration, rng)
+    names = list(args.mix)
+    operations = rng.choices(names, weights=[args.mix[n] for n in names], k=len(schedule))
+    prompts = [make_prompt(rng, i) for i in range(len(schedule))]
+    factory = RequestFactory(args.size, make_edit_image_b64(args.edit_image_size) if "edit" in names else None)
+
+    sampler = ProcessSampler(server_pid)
+    sampler_task = asyncio.create_task(sampler.run())
+    cpu_before = sampler.cpu_seconds()
+    started = time.perf_counter()
+    results, max_lag = await run_load(url, schedule, operations, prompts, factory, args.timeout, args.max_connections)
+    elapsed = time.perf_counter() - started
+    cpu_after = sampler.cpu_seconds()
+    sampler_task.cancel()
+
+    cpu_used = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    summary = summarize(results, args.duration, elapsed, sampler, cpu_used)
+    summary["max_dispatch_lag"] = max_lag
+    summary["config"] = {
+        "rate": args.rate,
+        "duration": args.duration,
+        "mix": args.mix,
+        "size": args.size,
+        "edit_image_size": args.edit_image_size,
+        "seed": args.seed,
+        "fake_latency": None if args.url else args.fake_latency,
+        "python": platform.python_version(),
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for the HTTP MCP server")
+    parser.add_argument("--url", help="JSON-RPC endpoint of a running server; if omitted, the fake Azure service and server are started")
+    parser.add_argument("--server-pid", type=int, help="PID of the running server, to report its RSS and CPU")
+    parser.add_argument("--rate", type=float, default=10.0, help="Target arrival rate, requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate arrivals for")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("generate=0.8,edit=0.2"), help="Operation weights, e.g. generate=0.8,edit=0.2")
+    parser.add_argument("--size", default="1024x1024", help="Size for generate_image")
+    parser.add_argument("--edit-image-size", default="1024x1024", help="Size of the uploaded edit image")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for arrivals, operation mix and prompts")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=1000, help="Client connection limit")
+    parser.add_argument("--fake-latency", default="lognormal:1.0,0.4", help="Latency spec for the fake Azure service")
+    parser.add_argument(
+        "--fake-args", nargs=argparse.REMAINDER, default=[],
+        help="Extra arguments for fake_azure.py; must come last, everything after it is passed on, e.g. --fake-args --rate-429 0.05"
+    )
+    parser.add_argument("--server-env", action="append", default=[], metavar="NAME=VALUE", help="Extra environment for the started server")
+    parser.add_argument("--json", help="Write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        summary = asyncio.run(run_benchmark(args, args.url, args.server_pid))
+    else:
+        extra_env = dict(item.split("=", 1) for item in args.server_env)
+        fake_args = ["--latency", args.fake_latency, "--seed", str(args.seed), *(part for item in args.fake_args for part in shlex.split(item))]
+        with run_subprocess(args=fake_args) as fake_url:
+            port = free_port()
+            log_dir = Path(tempfile.mkdtemp(prefix="mcp-loadtest-"))
+            server = start_server(fake_url, port, extra_env, log_dir)
+            print(f"Server logs: {log_dir / 'logs'}", file=sys.stderr)
+            try:
+                wait_for_health(f"http://127.0.0.1:{port}", server)
+                summary = asyncio.run(run_benchmark(args, f"http://127.0.0.1:{port}/", server.pid))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the CPU work on the request hot path
+
+Covers the steps that run on the event loop for every request: prompt
+language checks, base64 decode/encode of realistic PNGs, header sniffing,
+PIL validation and re-encoding, parsing Azure's JSON response and serializing the
+JSON-RPC response.
+
+    python benchmarks/microbench.py --save baseline.json
+    python benchmarks/microbench.py --baseline baseline.json --threshold 0.10
+
+With --baseline, each result is compared to the stored one and the exit
+status is 1 if any median got slower by more than the threshold.
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+try:
+    import httpx
+    import PIL
+    from PIL import Image
+    from starlette.responses import JSONResponse
+except ImportError as e:
+    print(f"Error: Required dependency missing: {e}", file=sys.stderr)
+    print("Please install required packages: pip install httpx pillow starlette", file=sys.stderr)
+    sys.exit(1)
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+SIZES = ("1024x1024", "1792x1024")
+
+
+def noise_png(size: str) -> bytes:
+    """A random-noise PNG, about as large as a generated image of that size"""
+    width, height = (int(v) for v in size.split("x"))
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def pil_verify(image_bytes: bytes):
+    """What handle_edit_image adds to validate an upload with IMAGE_VALIDATION=full"""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        width, height = img.size
+        img.verify()
+
+
+def pil_reencode(image_bytes: bytes):
+    """Full decode and PNG re-encode, the validation approach before in-memory edits"""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+
+
+def build_benchmarks() -> dict[str, Callable[[], Any]]:
+    from image_header import sniff_image
+    from mcp_server_http import is_english_text
+
+    long_prompt = ("A highly detailed oil painting of a quiet harbor town at dawn, fishing boats, "
+                   "mist over the water, warm light on the rooftops. ") * 40
+    benchmarks: dict[str, Callable[[], Any]] = {
+        "is_english_text/long_prompt": lambda: is_english_text(long_prompt),
+    }
+
+    for size in SIZES:
+        png = noise_png(size)
+        b64 = base64.b64encode(png).decode("ascii")
+        azure_body = json.dumps({"created": 0, "data": [{"b64_json": b64}]}).encode()
+        rpc_body = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "result": {"content": [
+                {"type": "text", "text": f"Image generation successful, size: {size}"},
+                {"type": "image", "data": b64, "mimeType": "image/png"}
+            ]}
+        }
+        benchmarks.update({
+            f"base64_decode/{size}": lambda b64=b64: base64.b64decode(b64),
+            f"base64_encode/{size}": lambda png=png: base64.b64encode(png).decode("utf-8"),
+            f"header_sniff/{size}": lambda png=png: sniff_image(png),
+            f"pil_verify/{size}": lambda png=png: pil_verify(png),
+            f"pil_reencode/{size}": lambda png=png: pil_reencode(png),
+            f"azure_response_json/{size}": lambda body=azure_body: httpx.Response(200, content=body).json(),
+            f"jsonrpc_serialize/{size}": lambda body=rpc_body: JSONResponse(body),
+        })
+    return benchmarks
+
+
+def time_calls(fn: Callable[[], Any], number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - started
+
+
+def measure(fn: Callable[[], Any], rounds: int, min_round_seconds: float) -> dict[str, Any]:
+    """Time fn in rounds of enough calls to last min_round_seconds, returning per-call seconds"""
+    fn()
+    number = 1
+    while True:
+        elapsed = time_calls(fn, number)
+        if elapsed >= min_round_seconds:
+            break
+        # Scale toward the target duration, at most 10x per step
+        number = max(number + 1, min(number * 10, int(number * min_round_seconds * 1.1 / max(elapsed, 1e-9))))
+
+    samples = [time_calls(fn, number) / number for _ in range(rounds)]
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+        "calls_per_round": number,
+    }
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f}ms"
+    return f"{seconds * 1e6:.2f}us"
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """Print each result against the baseline and return the names that regressed"""
+    regressions = []
+    print(f"\n{'benchmark':<36}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<36}{'-':>12}{format_time(result['median']):>12}{'new':>10}")
+            continue
+        change = result["median"] / base["median"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<36}{format_time(base['median']):>12}{format_time(result['median']):>12}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the request hot path")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--rounds", type=int, default=7, help="Timed rounds per benchmark")
+    parser.add_argument("--min-round-seconds", type=float, default=0.2, help="Minimum duration of one round")
+    parser.add_argument("--save", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --save")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown of the median before failing, e.g. 0.10 for 10%%")
+    args = parser.parse_args()
+
+    benchmarks = build_benchmarks()
+    if args.filter:
+        benchmarks = {name: fn for name, fn in benchmarks.items() if args.filter in name}
+
+    results = {}
+    print(f"{'benchmark':<36}{'median':>12}{'min':>12}{'stdev':>12}")
+    for name, fn in benchmarks.items():
+        result = measure(fn, args.rounds, args.min_round_seconds)
+        results[name] = result
+        print(f"{name:<36}{format_time(result['median']):>12}{format_time(result['min']):>12}{format_time(result['stdev']):>12}")
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "pillow": PIL.__version__,
+            "httpx": httpx.__version__,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(output, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Admission control for upstream Azure calls
+
+Caps the number of concurrent upstream requests and queues the rest in a
+bounded FIFO. When the queue is full, callers are rejected immediately
+instead of piling up work the server cannot finish.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when an upstream call cannot be admitted"""
+
+
+class AdmissionLimiter:
+    def __init__(
+        self,
+        max_concurrent: int = 16,
+        max_queue: int = 100,
+        queue_timeout: Optional[float] = None,
+        name: str = "upstream"
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Names the limited resource in rejection messages, e.g. "Server busy: 16 upstream calls in progress"
+        self.name = name
+        self._active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _record_admission(self, started: float):
+        wait = time.monotonic() - started
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    async def acquire(self):
+        """Wait for a slot, raising QueueFullError if none can be had"""
+        started = time.monotonic()
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self._record_admission(started)
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Server busy: {self._active} {self.name} calls in progress and {self.queue_depth} queued"
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            if self.queue_timeout:
+                await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            else:
+                await waiter
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived just as we timed out, pass it on
+                self.release()
+            else:
+                waiter.cancel()
+            self.timed_out += 1
+            raise QueueFullError(f"Server busy: no {self.name} slot within {self.queue_timeout}s")
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        self._record_admission(started)
+
+    def release(self):
+        """Hand the slot to the next queued caller, or free it"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict[str, Any]:
+        """Return concurrency, queue depth and wait-time metrics"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+        }
@@ -0,0 +1,187 @@
+"""
+Azure configuration shared by the STDIO and HTTP servers
+
+Reads the deployment settings from environment variables, including the
+optional AZURE_ENDPOINTS list, and builds the pooled AzureImageGenerator
+with its cache, admission control, retries, load balancer and per-endpoint
+circuit breakers.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Optional
+
+from admission import AdmissionLimiter
+from azure_image_client import AzureImageGenerator
+from circuit_breaker import circuit_breaker_from_env
+from image_cache import image_cache_from_env
+from image_workers import ImageWorkers
+from load_balancer import Endpoint, EndpointBalancer
+from retry import retry_budget_from_env, retry_policy_from_env
+
+logger = logging.getLogger(__name__)
+
+
+def get_azure_config():
+    """Get Azure configuration from environment variables"""
+    try:
+        required_vars = {
+            "AZURE_BASE_URL": "Base URL for Azure AI service",
+            "AZURE_API_KEY": "API key for Azure AI service", 
+            "AZURE_DEPLOYMENT_NAME": "Deployment model name"
+        }
+        
+        missing_vars = []
+        config = {}
+        
+        for var_name, description in required_vars.items():
+            value = os.getenv(var_name)
+            if not value or not value.strip():
+                missing_vars.append(f"{var_name} ({description})")
+            else:
+                key_map = {
+                    "AZURE_BASE_URL": "base_url",
+                    "AZURE_API_KEY": "api_key",
+                    "AZURE_DEPLOYMENT_NAME": "deployment_name"
+                }
+                config[key_map[var_name]] = value.strip()
+        
+        # Handle optional variables
+        model_value = os.getenv("AZURE_MODEL")
+        config["model"] = model_value.strip() if model_value and model_value.strip() else "flux.1-kontext-pro"
+        
+        api_version_value = os.getenv("AZURE_API_VERSION")
+        config["api_version"] = api_version_value.strip() if api_version_value and api_version_value.strip() else "2025-04-01-preview"
+        
+        # Optional list of deployments to load balance across, as a JSON array of
+        # {"base_url", "api_key", "deployment_name", "weight"} objects
+        endpoints_value = os.getenv("AZURE_ENDPOINTS")
+        if endpoints_value and endpoints_value.strip():
+            config["endpoints"] = parse_endpoints(endpoints_value)
+            # The single-deployment variables default to the first endpoint
+            for key in ("base_url", "api_key", "deployment_name"):
+                config.setdefault(key, config["endpoints"][0][key])
+            missing_vars = []
+        
+        if missing_vars:
+            error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # Basic validation
+        if not config["base_url"].startswith(("http://", "https://")):
+            raise ValueError("AZURE_BASE_URL must be a valid HTTP/HTTPS URL")
+        
+        if len(config["api_key"]) < 10:
+            raise ValueError("AZURE_API_KEY is too short, please check if the API key is correct")
+        
+        if not config["deployment_name"]:
+            raise ValueError("AZURE_DEPLOYMENT_NAME cannot be empty")
+        
+        if "endpoints" not in config:
+            config["endpoints"] = [{
+                "base_url": config["base_url"],
+                "api_key": config["api_key"],
+                "deployment_name": config["deployment_name"],
+                "weight": 1.0
+            }]
+        
+        logger.info("Azure configuration loaded successfully")
+        return config
+        
+    except ValueError:
+        raise
+    except Exception as e:
+        error_msg = f"Error loading Azure configuration: {str(e)}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+
+
+def parse_endpoints(value: str) -> list[dict[str, Any]]:
+    """Parse and validate the AZURE_ENDPOINTS JSON array"""
+    try:
+        endpoints = json.loads(value)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"AZURE_ENDPOINTS must be a JSON array: {str(e)}")
+    if not isinstance(endpoints, list) or not endpoints:
+        raise ValueError("AZURE_ENDPOINTS must be a non-empty JSON array")
+    
+    parsed = []
+    for index, endpoint in enumerate(endpoints):
+        if not isinstance(endpoint, dict):
+            raise ValueError(f"AZURE_ENDPOINTS[{index}] must be an object")
+        base_url = str(endpoint.get("base_url", "")).strip()
+        api_key = str(endpoint.get("api_key", "")).strip()
+        deployment_name = str(endpoint.get("deployment_name", "")).strip()
+        if not base_url.startswith(("http://", "https://")):
+            raise ValueError(f"AZURE_ENDPOINTS[{index}].base_url must be a valid HTTP/HTTPS URL")
+        if len(api_key) < 10:
+            raise ValueError(f"AZURE_ENDPOINTS[{index}].api_key is too short, please check if the API key is correct")
+        if not deployment_name:
+            raise ValueError(f"AZURE_ENDPOINTS[{index}].deployment_name cannot be empty")
+        try:
+            weight = float(endpoint.get("weight", 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"AZURE_ENDPOINTS[{index}].weight must be a number")
+        if weight <= 0:
+            raise ValueError(f"AZURE_ENDPOINTS[{index}].weight must be positive")
+        parsed.append({
+            "base_url": base_url,
+            "api_key": api_key,
+            "deployment_name": deployment_name,
+            "weight": weight,
+            "name": endpoint.get("name")
+        })
+    return parsed
+
+
+def generator_from_env(
+    azure_config: dict[str, Any],
+    image_workers: Optional[ImageWorkers] = None,
+    write_behind: bool = False
+) -> AzureImageGenerator:
+    """Create an AzureImageGenerator for azure_config, tuned from environment variables"""
+    endpoints = [
+        Endpoint(
+            base_url=endpoint["base_url"],
+            api_key=endpoint["api_key"],
+            deployment_name=endpoint["deployment_name"],
+            weight=endpoint["weight"],
+            name=endpoint.get("name")
+        )
+        for endpoint in azure_config["endpoints"]
+    ]
+    for endpoint in endpoints:
+        endpoint.breaker = circuit_breaker_from_env(endpoint.name)
+    return AzureImageGenerator(
+        base_url=azure_config["base_url"],
+        api_key=azure_config["api_key"],
+        deployment_name=azure_config["deployment_name"],
+        model=azure_config["model"],
+        api_version=azure_config["api_version"],
+        timeout=float(os.getenv("AZURE_TIMEOUT", "300")),
+        max_connections=int(os.getenv("AZURE_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("AZURE_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("AZURE_KEEPALIVE_EXPIRY", "30")),
+        cache=image_cache_from_env(),
+        write_behind=write_behind,
+        coalesce=os.getenv("AZURE_COALESCE_REQUESTS", "true").strip().lower() in ("1", "true", "yes"),
+        limiter=AdmissionLimiter(
+            max_concurrent=int(os.getenv("AZURE_MAX_CONCURRENT_REQUESTS", "16")),
+            max_queue=int(os.getenv("AZURE_MAX_QUEUED_REQUESTS", "100")),
+            queue_timeout=float(os.getenv("AZURE_QUEUE_TIMEOUT", "0")) or None
+        ),
+        retry_policies={
+            "generate": retry_policy_from_env("generate"),
+            "edit": retry_policy_from_env("edit")
+        },
+        retry_budget=retry_budget_from_env(),
+        balancer=EndpointBalancer(
+            endpoints,
+            ewma_alpha=float(os.getenv("AZURE_LATENCY_EWMA_ALPHA", "0.3")),
+            eject_after_failures=int(os.getenv("AZURE_EJECT_AFTER_FAILURES", "5")),
+            eject_seconds=float(os.getenv("AZURE_EJECT_SECONDS", "30"))
+        ),
+        image_workers=image_workers
+    )
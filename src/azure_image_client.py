@@ -1,34 +1,159 @@
+import asyncio
 import base64
-import io
+import hashlib
+import logging
+import time
 import httpx
 import aiofiles
-from PIL import Image
-from typing import Optional, Union
+from typing import BinaryIO, Optional, Union
+
+from admission import AdmissionLimiter, QueueFullError
+from circuit_breaker import CircuitOpenError
+from image_cache import ImageCache, make_cache_key
+from image_header import ImageHeader, sniff_image
+from image_workers import ImageWorkers, inspect_image_header
+from load_balancer import Endpoint, EndpointBalancer
+from metrics import AZURE_REQUESTS_IN_FLIGHT, AZURE_RESPONSES, PHASE_SECONDS
+from tracing import current_span, inject_trace_headers, set_span_attributes, start_span, traced_phase
+from retry import RetryBudget, RetryPolicy
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 
 class AzureImageGenerator:
-    def __init__(self, base_url: str, api_key: str, deployment_name: str, model: str = "flux.1-kontext-pro", api_version: str = "2025-04-01-preview"):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        deployment_name: str,
+        model: str = "flux.1-kontext-pro",
+        api_version: str = "2025-04-01-preview",
+        timeout: float = 300.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        cache: Optional[ImageCache] = None,
+        write_behind: bool = False,
+        coalesce: bool = True,
+        limiter: Optional[AdmissionLimiter] = None,
+        retry_policies: Optional[dict[str, RetryPolicy]] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        balancer: Optional[EndpointBalancer] = None,
+        image_workers: Optional[ImageWorkers] = None
+    ):
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.deployment_name = deployment_name
         self.model = model
         self.api_version = api_version
-        # Increase timeout duration
-        timeout = httpx.Timeout(300.0)  # 5-minute timeout
-        self.client = httpx.AsyncClient(timeout=timeout)
+        # Connection pool is reused across calls, so keep-alive connections
+        # to Azure survive between requests when the generator is long-lived
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(timeout), limits=limits)
+        self.cache = cache
+        # When set, output_path saves for return_bytes calls run in the
+        # background so the caller gets the bytes without waiting on disk
+        self.write_behind = write_behind
+        self._pending_writes: set[asyncio.Task] = set()
+        # Identical requests already in flight share one upstream call
+        self.single_flight = SingleFlight() if coalesce else None
+        # Caps concurrent upstream calls, excess callers wait in a bounded queue
+        self.limiter = limiter
+        # Per-operation ("generate", "edit") retry policies, sharing one retry budget
+        self.retry_policies = retry_policies or {}
+        self.retry_budget = retry_budget
+        self.retries = 0
+        # Routes each attempt to one of several deployments, each with its own
+        # circuit breaker; a single endpoint built from base_url/api_key/deployment_name
+        # and without a breaker by default
+        self.balancer = balancer or EndpointBalancer([Endpoint(self.base_url, api_key, deployment_name)])
+        # PIL work runs on this pool, or a default thread, instead of the event loop
+        self.image_workers = image_workers
         
     async def __aenter__(self):
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Finish pending file writes and close the underlying HTTP connection pool"""
+        await self.flush_writes()
         await self.client.aclose()
 
+    async def flush_writes(self):
+        """Wait for all background output_path writes to finish"""
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes), return_exceptions=True)
+
+    @property
+    def is_closed(self) -> bool:
+        return self.client.is_closed
+
+    def generation_cache_key(self, prompt: str, size: str, n: int = 1, index: int = 0) -> str:
+        """Cache key for one image of a generation request against this deployment"""
+        return make_cache_key(
+            operation="generate",
+            prompt=prompt,
+            size=size,
+            n=n,
+            index=index,
+            model=self.model,
+            api_version=self.api_version,
+            deployment=f"{self.base_url}/{self.deployment_name}"
+        )
+
+    def edit_cache_key(self, image_data: bytes, prompt: str, size: Optional[str]) -> str:
+        """Cache key for an edit request, keyed by the input image digest"""
+        return make_cache_key(
+            operation="edit",
+            image_sha256=hashlib.sha256(image_data).hexdigest(),
+            prompt=prompt,
+            size=size or "",
+            model=self.model,
+            api_version=self.api_version,
+            deployment=f"{self.base_url}/{self.deployment_name}"
+        )
+
+    async def _write_file(self, path: str, data: bytes):
+        with traced_phase("disk_write"):
+            async with aiofiles.open(path, 'wb') as f:
+                await f.write(data)
+
+    def _on_write_done(self, task: asyncio.Task):
+        self._pending_writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background image write failed: {task.exception()}")
+
+    async def _deliver(
+        self,
+        image_bytes: bytes,
+        output_path: Optional[str],
+        return_bytes: bool = False
+    ) -> Union[bytes, str]:
+        """Save to output_path if given, and hand back either the path or the bytes"""
+        if not output_path:
+            return image_bytes
+        if return_bytes and self.write_behind:
+            task = asyncio.create_task(self._write_file(output_path, image_bytes))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._on_write_done)
+            return image_bytes
+        await self._write_file(output_path, image_bytes)
+        return image_bytes if return_bytes else output_path
+
     async def generate_image(
         self, 
         prompt: str, 
         size: str = "1024x1024", 
         n: int = 1,
-        output_path: Optional[str] = None
+        output_path: Optional[str] = None,
+        return_bytes: bool = False
     ) -> Union[bytes, str]:
         """
         Generate image
@@ -36,17 +161,136 @@ class AzureImageGenerator:
         Args:
             prompt: Text prompt
             size: Image size, e.g. "1024x1024"
-            n: Number of images to generate
+            n: Number of images to generate, only the first is returned (see generate_images)
             output_path: Optional output path, saves file if provided
+            return_bytes: Return image bytes even when output_path is provided
         
         Returns:
-            File path if output_path provided, otherwise returns image bytes data
+            File path if output_path provided and return_bytes is False, otherwise image bytes data
         """
-        url = f"{self.base_url}/openai/deployments/{self.deployment_name}/images/generations"
+        results = await self.generate_images(
+            prompt=prompt,
+            size=size,
+            n=n,
+            output_paths=[output_path] if output_path else None,
+            return_bytes=return_bytes
+        )
+        return results[0]
+
+    async def _coalesce(self, key: str, fn):
+        """Share one upstream call between concurrent identical requests"""
+        if self.single_flight is None:
+            return await fn()
+        return await self.single_flight.do(key, fn)
+
+    @staticmethod
+    def _is_upstream_failure(error: BaseException) -> bool:
+        """Whether an error reflects endpoint health rather than a bad request"""
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            return status >= 500 or status in (408, 429)
+        return not isinstance(error, asyncio.CancelledError)
+
+    async def _send(self, operation: str, endpoint: Endpoint, path: str, **kwargs) -> dict:
+        """POST once to an endpoint and return the parsed JSON body, recording the outcome"""
+        headers = {**kwargs.pop("headers", {}), "Authorization": f"Bearer {endpoint.api_key}"}
+        params = {"api-version": self.api_version}
+        url = endpoint.url_for(path)
         
+        with start_span(f"POST {path}", {"http.request.method": "POST", "url.full": url, "azure.endpoint": endpoint.name}, kind="client") as span:
+            client_request_id = inject_trace_headers(headers)
+            set_span_attributes(span, {"azure.client_request_id": client_request_id})
+            
+            self.balancer.start(endpoint)
+            started = time.monotonic()
+            try:
+                with AZURE_REQUESTS_IN_FLIGHT.track_inprogress(operation=operation):
+                    try:
+                        with PHASE_SECONDS.time(phase="upstream_request"):
+                            response = await self.client.post(url, headers=headers, params=params, **kwargs)
+                    except httpx.TransportError:
+                        AZURE_RESPONSES.inc(operation=operation, code="error")
+                        raise
+                AZURE_RESPONSES.inc(operation=operation, code=response.status_code)
+                set_span_attributes(span, {
+                    "http.response.status_code": response.status_code,
+                    "azure.request_id": response.headers.get("apim-request-id") or response.headers.get("x-request-id")
+                })
+                response.raise_for_status()
+                with traced_phase("json_parse"):
+                    result = response.json()
+            except BaseException as e:
+                if isinstance(e, asyncio.CancelledError):
+                    self.balancer.cancel(endpoint)
+                    if endpoint.breaker is not None:
+                        endpoint.breaker.record_ignored()
+                else:
+                    failed = self._is_upstream_failure(e)
+                    duration = time.monotonic() - started
+                    self.balancer.finish(endpoint, failed, duration)
+                    if endpoint.breaker is not None:
+                        endpoint.breaker.record(failed, duration)
+                raise
+            duration = time.monotonic() - started
+            self.balancer.finish(endpoint, False, duration)
+            if endpoint.breaker is not None:
+                endpoint.breaker.record(False, duration)
+            return result
+
+    async def _post_once(self, operation: str, endpoint: Endpoint, path: str, **kwargs) -> dict:
+        """POST to an endpoint through its circuit breaker and admission control"""
+        if endpoint.breaker is not None:
+            endpoint.breaker.before_call()
+        if self.limiter is None:
+            return await self._send(operation, endpoint, path, **kwargs)
+        try:
+            with start_span("admission_wait"):
+                await self.limiter.acquire()
+        except BaseException:
+            if endpoint.breaker is not None:
+                endpoint.breaker.record_ignored()
+            raise
+        try:
+            return await self._send(operation, endpoint, path, **kwargs)
+        finally:
+            self.limiter.release()
+
+    async def _post(self, operation: str, path: str, **kwargs) -> dict:
+        """POST to Azure, retrying transient failures according to the operation's policy"""
+        policy = self.retry_policies.get(operation)
+        if self.retry_budget is not None:
+            self.retry_budget.record_request()
+        attempt = 1
+        delay = 0.0
+        tried: list[Endpoint] = []
+        with start_span(f"azure {operation}", {"azure.operation": operation}) as span:
+            while True:
+                # Retries prefer an endpoint that has not failed this request yet
+                endpoint = self.balancer.pick(exclude=tried)
+                tried.append(endpoint)
+                try:
+                    return await self._post_once(operation, endpoint, path, **kwargs)
+                except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                    if policy is None or attempt >= policy.max_attempts or not policy.is_retryable(e):
+                        raise
+                    delay = policy.delay_for(e, delay)
+                    if delay is None:
+                        raise
+                    if self.retry_budget is not None and not self.retry_budget.try_spend():
+                        logger.warning(f"Retry budget exhausted, not retrying {operation} request")
+                        raise
+                    reason = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+                    logger.warning(f"Azure {operation} attempt {attempt} on {endpoint.name} failed ({reason}), retrying in {delay:.2f}s")
+                    self.retries += 1
+                    attempt += 1
+                    set_span_attributes(span, {"azure.retries": attempt - 1})
+                    # The admission slot is released while we back off
+                    await asyncio.sleep(delay)
+
+    async def _request_generation(self, prompt: str, size: str, n: int) -> list[bytes]:
+        """POST a generation request to Azure and decode the returned images"""
         headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
+            "Content-Type": "application/json"
         }
         
         data = {
@@ -56,28 +300,105 @@ class AzureImageGenerator:
             "model": self.model
         }
         
-        params = {"api-version": self.api_version}
+        result = await self._post("generate", "images/generations", json=data, headers=headers)
+        
+        if "data" not in result or len(result["data"]) == 0:
+            raise Exception("No image data returned from API")
         
+        # Decode every returned image, Azure may return fewer than n
+        with traced_phase("base64_decode"):
+            return [base64.b64decode(item["b64_json"]) for item in result["data"][:n]]
+
+    async def _image_header(self, image_data: bytes) -> ImageHeader:
+        """Format and dimensions of an input image, from its header when possible"""
         try:
-            response = await self.client.post(url, json=data, headers=headers, params=params)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            if "data" not in result or len(result["data"]) == 0:
-                raise Exception("No image data returned from API")
-            
-            # Get base64 encoded image data
-            b64_image = result["data"][0]["b64_json"]
-            image_bytes = base64.b64decode(b64_image)
+            return sniff_image(image_data)
+        except ValueError:
+            pass
+        # Other formats need PIL, which runs on the worker pool
+        try:
+            return await inspect_image_header(self.image_workers, image_data)
+        except QueueFullError:
+            raise
+        except Exception as e:
+            raise Exception(f"Could not determine image dimensions: {str(e)}")
+
+    async def _request_edit(self, image_data: bytes, prompt: str, size: Optional[str]) -> bytes:
+        """POST an edit request to Azure and decode the returned image"""
+        header = await self._image_header(image_data)
+        # Use original image dimensions if size not specified
+        if not size:
+            size = f"{header.width}x{header.height}"
+        
+        # Prepare multipart form data, sending the image bytes as uploaded
+        files = {
+            "model": (None, self.model),
+            "image": (header.filename, image_data, header.mime_type),
+            "prompt": (None, prompt),
+            "size": (None, size)
+        }
+        
+        result = await self._post("edit", "images/edits", files=files)
+        
+        if "data" not in result or len(result["data"]) == 0:
+            raise Exception("No image data returned from API")
+        
+        # Get base64 encoded image data
+        b64_image = result["data"][0]["b64_json"]
+        with traced_phase("base64_decode"):
+            return base64.b64decode(b64_image)
+
+    async def generate_images(
+        self,
+        prompt: str,
+        size: str = "1024x1024",
+        n: int = 1,
+        output_paths: Optional[list[Optional[str]]] = None,
+        return_bytes: bool = False
+    ) -> list[Union[bytes, str]]:
+        """
+        Generate one or more images in a single request
+        
+        Args:
+            prompt: Text prompt
+            size: Image size, e.g. "1024x1024"
+            n: Number of images to generate
+            output_paths: Optional per-index output paths, images with a path are saved to it
+            return_bytes: Return image bytes even for images that were saved
+        
+        Returns:
+            One entry per image: file path if saved and return_bytes is False, otherwise image bytes data
+        """
+        output_paths = list(output_paths or [])
+        output_paths += [None] * (n - len(output_paths))
+
+        cache_keys = [self.generation_cache_key(prompt, size, n, i) for i in range(n)]
+        if self.cache is not None:
+            cached = [await self.cache.get(key) for key in cache_keys]
+            if all(item is not None for item in cached):
+                set_span_attributes(current_span(), {"cache.hit": True})
+                return [
+                    await self._deliver(image_bytes, output_paths[i], return_bytes)
+                    for i, image_bytes in enumerate(cached)
+                ]
+
+        async def fetch() -> list[bytes]:
+            images = await self._request_generation(prompt, size, n)
+            if self.cache is not None and len(images) == n:
+                for key, image_bytes in zip(cache_keys, images):
+                    await self.cache.put(key, image_bytes)
+            return images
+
+        try:
+            images = await self._coalesce(cache_keys[0], fetch)
             
-            if output_path:
-                async with aiofiles.open(output_path, 'wb') as f:
-                    await f.write(image_bytes)
-                return output_path
-            else:
-                return image_bytes
+            return [
+                await self._deliver(image_bytes, output_paths[i], return_bytes)
+                for i, image_bytes in enumerate(images)
+            ]
                 
+        except (QueueFullError, CircuitOpenError):
+            raise
         except httpx.HTTPStatusError as e:
             error_detail = e.response.text if e.response else str(e)
             raise Exception(f"Azure API error: {e.response.status_code} - {error_detail}")
@@ -86,10 +407,12 @@ class AzureImageGenerator:
 
     async def edit_image(
         self, 
-        image_path: str,
+        image_path: Optional[str] = None,
         prompt: str = "",
         size: Optional[str] = None,
-        output_path: Optional[str] = None
+        output_path: Optional[str] = None,
+        image_data: Optional[Union[bytes, BinaryIO]] = None,
+        return_bytes: bool = False
     ) -> Union[bytes, str]:
         """
         Edit image
@@ -99,76 +422,44 @@ class AzureImageGenerator:
             prompt: Edit prompt
             size: Optional size override, if not provided uses original image dimensions
             output_path: Optional output path, saves file if provided
+            image_data: Input image as bytes or a binary buffer, used instead of image_path
+            return_bytes: Return image bytes even when output_path is provided
         
         Returns:
-            File path if output_path provided, otherwise returns image bytes data
+            File path if output_path provided and return_bytes is False, otherwise image bytes data
         """
-        url = f"{self.base_url}/openai/deployments/{self.deployment_name}/images/edits"
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        params = {"api-version": self.api_version}
-        
         try:
             # Validate input parameters
-            if not image_path:
-                raise Exception("image_path parameter is required")
+            if image_data is None and not image_path:
+                raise Exception("image_path or image_data parameter is required")
             
-            # Read image file
-            async with aiofiles.open(image_path, 'rb') as f:
-                image_data = await f.read()
+            if image_data is None:
+                # Read image file
+                async with aiofiles.open(image_path, 'rb') as f:
+                    image_data = await f.read()
+            elif not isinstance(image_data, (bytes, bytearray, memoryview)):
+                image_data = image_data.read()
+            image_data = bytes(image_data)
             
-            # Get original image dimensions if size not specified
-            if not size:
-                try:
-                    with Image.open(io.BytesIO(image_data)) as img:
-                        width, height = img.size
-                        size = f"{width}x{height}"
-                except Exception as e:
-                    # If we can't read dimensions, try to detect from file path
-                    try:
-                        with Image.open(image_path) as img:
-                            width, height = img.size
-                            size = f"{width}x{height}"
-                    except Exception as e2:
-                        # Default to 1024x1024 if all else fails
-                        size = "1024x1024"
-                        raise Exception(f"Could not determine image dimensions, tried BytesIO and file path: {str(e)}, {str(e2)}")
-            
-            # Prepare multipart form data
-            files = {
-                "model": (None, self.model),
-                "image": ("image.png", image_data, "image/png"),
-                "prompt": (None, prompt),
-                "size": (None, size)
-            }
-            
-            response = await self.client.post(
-                url, 
-                files=files, 
-                headers=headers, 
-                params=params
-            )
-            response.raise_for_status()
-            
-            result = response.json()
+            cache_key = self.edit_cache_key(image_data, prompt, size)
+            if self.cache is not None:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    set_span_attributes(current_span(), {"cache.hit": True})
+                    return await self._deliver(cached, output_path, return_bytes)
             
-            if "data" not in result or len(result["data"]) == 0:
-                raise Exception("No image data returned from API")
+            async def fetch() -> bytes:
+                image_bytes = await self._request_edit(image_data, prompt, size)
+                if self.cache is not None:
+                    await self.cache.put(cache_key, image_bytes)
+                return image_bytes
             
-            # Get base64 encoded image data
-            b64_image = result["data"][0]["b64_json"]
-            image_bytes = base64.b64decode(b64_image)
+            image_bytes = await self._coalesce(cache_key, fetch)
             
-            if output_path:
-                async with aiofiles.open(output_path, 'wb') as f:
-                    await f.write(image_bytes)
-                return output_path
-            else:
-                return image_bytes
+            return await self._deliver(image_bytes, output_path, return_bytes)
                 
+        except (QueueFullError, CircuitOpenError):
+            raise
         except httpx.HTTPStatusError as e:
             error_detail = e.response.text if e.response else str(e)
             raise Exception(f"Azure API error: {e.response.status_code} - {error_detail}")
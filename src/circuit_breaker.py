@@ -0,0 +1,145 @@
+"""
+Circuit breaker around the Azure deployment
+
+Tracks the outcome and latency of recent upstream calls. When too many
+fail or run slow, the circuit opens and calls fail immediately instead of
+waiting on a degraded endpoint. After a cool-down a few probe calls are
+let through (half-open); if they succeed the circuit closes again.
+"""
+
+import os
+import time
+from collections import deque
+from typing import Any, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str = "azure",
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 120.0,
+        slow_call_rate_threshold: float = 0.8,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._window: deque[tuple[bool, bool]] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def _rates(self) -> tuple[float, float]:
+        if not self._window:
+            return 0.0, 0.0
+        failures = sum(1 for failed, _ in self._window if failed)
+        slow = sum(1 for _, was_slow in self._window if was_slow)
+        return failures / len(self._window), slow / len(self._window)
+
+    def allows_call(self) -> bool:
+        """Whether before_call would admit a call right now"""
+        state = self.state
+        if state == OPEN:
+            return False
+        return state == CLOSED or self._probes_in_flight < self.half_open_max_calls
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError"""
+        state = self.state
+        if state == OPEN:
+            self.rejected += 1
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(f"Circuit '{self.name}' is open, Azure endpoint unhealthy. Retry in {retry_in:.0f}s")
+        if state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit '{self.name}' is half-open, waiting for probe calls to finish")
+            self._probes_in_flight += 1
+
+    def record(self, failed: bool, duration: float):
+        """Record the outcome of an admitted call"""
+        slow = duration >= self.slow_call_seconds
+        if self._state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if failed or slow:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_max_calls:
+                self._state = CLOSED
+                self._window.clear()
+            return
+
+        self._window.append((failed, slow))
+        if self._state == CLOSED and len(self._window) >= self.min_calls:
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._open()
+
+    def record_ignored(self):
+        """Release an admitted call that never reached the endpoint"""
+        if self._state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self) -> dict[str, Any]:
+        """Return breaker state and recent error/latency rates"""
+        failure_rate, slow_rate = self._rates()
+        return {
+            "name": self.name,
+            "state": self.state,
+            "window_calls": len(self._window),
+            "failure_rate": round(failure_rate, 4),
+            "slow_call_rate": round(slow_rate, 4),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+def circuit_breaker_from_env(name: str = "azure") -> Optional[CircuitBreaker]:
+    """Create a CircuitBreaker from environment variables, or None if disabled"""
+    if os.getenv("AZURE_BREAKER_ENABLED", "true").strip().lower() not in ("1", "true", "yes"):
+        return None
+    return CircuitBreaker(
+        name=name,
+        failure_rate_threshold=float(os.getenv("AZURE_BREAKER_FAILURE_RATE", "0.5")),
+        slow_call_seconds=float(os.getenv("AZURE_BREAKER_SLOW_CALL_SECONDS", "120")),
+        slow_call_rate_threshold=float(os.getenv("AZURE_BREAKER_SLOW_CALL_RATE", "0.8")),
+        window_size=int(os.getenv("AZURE_BREAKER_WINDOW", "20")),
+        min_calls=int(os.getenv("AZURE_BREAKER_MIN_CALLS", "5")),
+        open_seconds=float(os.getenv("AZURE_BREAKER_OPEN_SECONDS", "30")),
+        half_open_max_calls=int(os.getenv("AZURE_BREAKER_HALF_OPEN_CALLS", "1"))
+    )
@@ -0,0 +1,191 @@
+"""
+Content-addressed image result cache
+
+Results are keyed on a SHA-256 of the canonicalized request parameters and
+kept in two tiers: an in-memory LRU capped by total bytes, and an on-disk
+store capped by total size that survives restarts.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+
+def canonicalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share a cache key"""
+    return " ".join((prompt or "").split())
+
+
+def make_cache_key(**fields: Any) -> str:
+    """Build a stable cache key from request parameters"""
+    canonical = {}
+    for name, value in fields.items():
+        if name == "prompt":
+            value = canonicalize_prompt(value)
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        canonical[name] = value
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        max_disk_bytes: int = 2 * 1024 * 1024 * 1024
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.bin"
+
+    def _load_disk_index(self):
+        """Rebuild the disk index from files left by a previous run, oldest first"""
+        entries = []
+        for path in self.cache_dir.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        entries.sort()
+        for _, key, size in entries:
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _remember(self, key: str, data: bytes):
+        """Insert into the memory tier, evicting least recently used entries"""
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        with self._disk_lock:
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        path = self._path_for(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except OSError:
+            with self._disk_lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file then rename, so readers never see partial data
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+        with self._disk_lock:
+            old = self._disk.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop least recently used files until the disk tier fits its cap"""
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions += 1
+            try:
+                self._path_for(key).unlink()
+            except OSError:
+                pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Look up cached bytes, promoting disk hits into memory"""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return data
+
+        if self.cache_dir is not None:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self.disk_hits += 1
+                self._remember(key, data)
+                return data
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        """Store bytes in both tiers"""
+        self._remember(key, data)
+        if self.cache_dir is not None:
+            try:
+                await asyncio.to_thread(self._write_disk, key, data)
+            except OSError:
+                # A failed disk write only costs a future miss
+                pass
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and tier usage"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+def image_cache_from_env() -> Optional[ImageCache]:
+    """Create an ImageCache from environment variables, or None if disabled"""
+    if os.getenv("IMAGE_CACHE_ENABLED", "false").strip().lower() not in ("1", "true", "yes"):
+        return None
+    cache_dir = os.getenv("IMAGE_CACHE_DIR", "cache/images").strip() or None
+    return ImageCache(
+        cache_dir=cache_dir,
+        max_memory_bytes=int(os.getenv("IMAGE_CACHE_MEMORY_MB", "256")) * 1024 * 1024,
+        max_disk_bytes=int(os.getenv("IMAGE_CACHE_DISK_MB", "2048")) * 1024 * 1024
+    )
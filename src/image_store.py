@@ -0,0 +1,204 @@
+"""
+Content-addressed store for result images
+
+Images are written once under the SHA-256 of their bytes, so the digest
+doubles as a stable URL path, ETag and MCP resource URI (image://{digest}),
+and identical results share one file. The HTTP server serves them from
+/images/{digest} and resources/read instead of embedding base64 in tool
+results. Entries expire ttl_seconds after they were last stored.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from image_header import MIME_TYPES, sniff_image
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+RESOURCE_URI_PREFIX = "image://"
+
+EXTENSIONS = {mime_type: image_format for image_format, mime_type in MIME_TYPES.items()}
+
+
+class StoredImage(NamedTuple):
+    digest: str
+    mime_type: str
+    size: int
+    path: Path
+    created_at: float
+
+    @property
+    def filename(self) -> str:
+        return self.path.name
+
+    @property
+    def uri(self) -> str:
+        return f"{RESOURCE_URI_PREFIX}{self.digest}"
+
+
+def parse_resource_uri(uri: str) -> Optional[str]:
+    """Return the digest in an image://{digest} URI, or None if it is not one"""
+    if not isinstance(uri, str) or not uri.startswith(RESOURCE_URI_PREFIX):
+        return None
+    digest = uri[len(RESOURCE_URI_PREFIX):]
+    return digest if DIGEST_PATTERN.match(digest) else None
+
+
+class ImageStore:
+    def __init__(self, root: str = "images/store", ttl_seconds: float = 86400.0):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        # Oldest first, so expired entries are always at the front
+        self._entries: "OrderedDict[str, StoredImage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+        if self.root.is_dir():
+            self._load_index()
+            self._delete(self._pop_expired())
+
+    def _load_index(self):
+        """Rebuild the index from files left by a previous run, oldest first"""
+        entries = []
+        for path in self.root.glob("*/*.*"):
+            digest, _, extension = path.name.partition(".")
+            if not DIGEST_PATTERN.match(digest) or extension not in MIME_TYPES:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append(StoredImage(digest, MIME_TYPES[extension], stat.st_size, path, stat.st_mtime))
+        for entry in sorted(entries, key=lambda e: e.created_at):
+            self._add(entry)
+
+    def _add(self, entry: StoredImage):
+        with self._lock:
+            old = self._entries.pop(entry.digest, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self._entries[entry.digest] = entry
+            self.total_bytes += entry.size
+
+    def _expired(self, entry: StoredImage, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created_at >= self.ttl_seconds
+
+    def _pop_expired(self) -> list[StoredImage]:
+        """Remove expired entries from the index and return them"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._entries:
+                entry = next(iter(self._entries.values()))
+                if not self._expired(entry, now):
+                    break
+                self._entries.popitem(last=False)
+                self.total_bytes -= entry.size
+                expired.append(entry)
+        self.evictions += len(expired)
+        return expired
+
+    @staticmethod
+    def _delete(entries: list[StoredImage]):
+        for entry in entries:
+            try:
+                entry.path.unlink()
+            except OSError:
+                pass
+
+    async def purge(self):
+        """Delete entries whose TTL has passed"""
+        expired = self._pop_expired()
+        if expired:
+            await asyncio.to_thread(self._delete, expired)
+
+    def forget(self, digest: str):
+        """Drop an entry whose file has disappeared"""
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            if entry is not None:
+                self.total_bytes -= entry.size
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file then rename, so readers never see partial data
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+    async def put(self, data: bytes) -> StoredImage:
+        """Store image bytes under their digest, reusing the file if it already exists"""
+        await self.purge()
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self._entries.get(digest)
+        if existing is not None:
+            # Storing the same image again restarts its TTL
+            entry = existing._replace(created_at=time.time())
+            try:
+                await asyncio.to_thread(os.utime, entry.path)
+                self._add(entry)
+                return entry
+            except OSError:
+                self.forget(digest)
+
+        try:
+            mime_type = sniff_image(data).mime_type
+        except ValueError:
+            mime_type = "image/png"
+        path = self.root / digest[:2] / f"{digest}.{EXTENSIONS[mime_type]}"
+        await asyncio.to_thread(self._write, path, data)
+        entry = StoredImage(digest, mime_type, len(data), path, time.time())
+        self._add(entry)
+        return entry
+
+    def get(self, digest: str) -> Optional[StoredImage]:
+        """Look up a stored image by digest, None if unknown or expired"""
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        entry = self._entries.get(digest)
+        if entry is None or self._expired(entry, time.time()):
+            return None
+        return entry
+
+    def entries(self) -> list[StoredImage]:
+        """Unexpired entries, oldest first"""
+        now = time.time()
+        with self._lock:
+            return [entry for entry in self._entries.values() if not self._expired(entry, now)]
+
+    async def read(self, digest: str) -> Optional[bytes]:
+        """Read the bytes of a stored image, None if unknown, expired or deleted"""
+        entry = self.get(digest)
+        if entry is None:
+            return None
+        try:
+            return await asyncio.to_thread(entry.path.read_bytes)
+        except FileNotFoundError:
+            self.forget(digest)
+            return None
+
+    def stats(self) -> dict[str, Any]:
+        """Return entry count, total size and TTL evictions"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+        }
+
+
+def image_store_from_env() -> Optional[ImageStore]:
+    """Create an ImageStore when IMAGE_DELIVERY is url or resource, or None for inline base64 results"""
+    if os.getenv("IMAGE_DELIVERY", "inline").strip().lower() not in ("url", "resource"):
+        return None
+    return ImageStore(
+        root=os.getenv("IMAGE_STORE_DIR", "images/store").strip() or "images/store",
+        ttl_seconds=float(os.getenv("IMAGE_STORE_TTL_SECONDS", "86400"))
+    )
@@ -0,0 +1,128 @@
+"""
+Worker pool for image CPU work
+
+Decoding, verifying or thumbnailing a large image in PIL blocks for tens
+of milliseconds. ImageWorkers runs that work on a thread or process pool
+behind a bounded queue, so the event loop keeps serving other requests.
+Functions passed to the pool must be module-level so they can be sent to
+worker processes.
+"""
+
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from PIL import Image, UnidentifiedImageError
+
+from admission import AdmissionLimiter
+from image_header import MIME_TYPES, ImageHeader
+
+
+def inspect_image(image_data: bytes) -> tuple[str, int, int]:
+    """Verify image data and return its format and dimensions, raising if it is not a valid image"""
+    try:
+        img = Image.open(io.BytesIO(image_data))
+    except UnidentifiedImageError:
+        raise ValueError("Unrecognized image format")
+    with img:
+        image_format = img.format.lower() if img.format else "png"
+        width, height = img.size
+        img.verify()
+    return image_format, width, height
+
+
+def make_thumbnail(image_data: bytes, max_side: int = 256) -> bytes:
+    """Downscale an image to fit within max_side pixels and encode it as JPEG"""
+    with Image.open(io.BytesIO(image_data)) as img:
+        # Lets JPEG decode straight to a reduced size
+        img.draft("RGB", (max_side, max_side))
+        img.thumbnail((max_side, max_side))
+        thumbnail = img.convert("RGB")
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+class ImageWorkers:
+    def __init__(self, mode: str = "thread", max_workers: int = 4, max_queue: int = 64):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown image worker mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        # Callers beyond max_workers wait in a bounded FIFO, then get QueueFullError
+        self.limiter = AdmissionLimiter(max_concurrent=max_workers, max_queue=max_queue, name="image worker")
+        self._executor: Optional[Executor] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image-worker")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) on the pool, raising QueueFullError if the queue is full"""
+        async with self.limiter.slot():
+            started = time.perf_counter()
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.busy_seconds += time.perf_counter() - started
+            self.completed += 1
+            return result
+
+    def shutdown(self):
+        """Stop the pool; it is recreated on the next run()"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, Any]:
+        """Return pool size, queue and run-time metrics"""
+        limiter = self.limiter.stats()
+        runs = self.completed + self.failed
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": limiter["max_queue"],
+            "active": limiter["active"],
+            "queue_depth": limiter["queue_depth"],
+            "rejected": limiter["rejected"],
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_seconds": limiter["avg_wait_seconds"],
+            "max_wait_seconds": limiter["max_wait_seconds"],
+            "avg_run_seconds": round(self.busy_seconds / runs, 4) if runs else 0.0,
+        }
+
+
+async def inspect_image_header(workers: Optional[ImageWorkers], image_data: bytes) -> ImageHeader:
+    """Verify an image with PIL on the pool, or a default thread, and return its header
+
+    For formats sniff_image cannot read, such as GIF, BMP or TIFF.
+    """
+    if workers is not None:
+        image_format, width, height = await workers.run(inspect_image, image_data)
+    else:
+        image_format, width, height = await asyncio.to_thread(inspect_image, image_data)
+    return ImageHeader(image_format, MIME_TYPES.get(image_format, f"image/{image_format}"), width, height)
+
+
+def image_workers_from_env() -> ImageWorkers:
+    """Create ImageWorkers from environment variables"""
+    return ImageWorkers(
+        mode=os.getenv("IMAGE_WORKER_MODE", "thread").strip().lower(),
+        max_workers=int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        max_queue=int(os.getenv("IMAGE_WORKER_QUEUE", "64"))
+    )
@@ -0,0 +1,201 @@
+"""
+In-process job store for asynchronous tool calls
+
+Jobs run as background tasks so the submitting request can return a job
+id immediately. At most max_concurrent jobs run at once; the rest stay
+queued until a slot frees up, so a burst of submissions waits instead of
+overflowing upstream admission control. The store is bounded: finished
+jobs expire after a TTL, and the oldest finished jobs are evicted first
+when it holds too many jobs or too many result bytes.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobStoreFullError(Exception):
+    """Raised when no more jobs can be accepted"""
+
+
+def result_size(result: dict[str, Any]) -> int:
+    """Approximate bytes held by a tool result, dominated by base64 image data"""
+    size = 0
+    for part in result.get("content", []):
+        for value in part.values():
+            if isinstance(value, str):
+                size += len(value)
+            elif isinstance(value, dict):
+                size += sum(len(v) for v in value.values() if isinstance(v, str))
+    return size
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[dict[str, Any]] = None
+        self.result_bytes = 0
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    def __init__(
+        self,
+        max_jobs: int = 1000,
+        ttl_seconds: float = 3600.0,
+        max_concurrent: int = 8,
+        max_result_bytes: int = 512 * 1024 * 1024
+    ):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_result_bytes = max_result_bytes
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self.result_bytes = 0
+        self.evicted = 0
+
+    def _drop(self, job_id: str):
+        job = self._jobs.pop(job_id)
+        self.result_bytes -= job.result_bytes
+
+    def _purge(self):
+        """Drop finished jobs whose TTL has passed"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and now - job.finished_at >= self.ttl_seconds
+        ]
+        for job_id in expired:
+            self._drop(job_id)
+
+    def _make_room(self):
+        self._purge()
+        if len(self._jobs) < self.max_jobs:
+            return
+        for job_id, job in self._jobs.items():
+            if job.done:
+                self._drop(job_id)
+                self.evicted += 1
+                return
+        raise JobStoreFullError(f"Job store full: {len(self._jobs)} jobs still queued or running")
+
+    def _keep_result(self, job: Job):
+        """Account for a finished job's result, evicting the oldest other finished jobs over the byte limit"""
+        job.result_bytes = result_size(job.result) if job.result is not None else 0
+        self.result_bytes += job.result_bytes
+        if self.result_bytes <= self.max_result_bytes:
+            return
+        for job_id, other in list(self._jobs.items()):
+            if self.result_bytes <= self.max_result_bytes:
+                break
+            if other is not job and other.done:
+                self._drop(job_id)
+                self.evicted += 1
+
+    def submit(
+        self,
+        kind: str,
+        run: Callable[[], Awaitable[dict[str, Any]]],
+        is_success: Callable[[dict[str, Any]], bool]
+    ) -> Job:
+        """Queue run() to start in the background and return its job"""
+        self._make_room()
+        job = Job(kind)
+        self._jobs[job.id] = job
+
+        async def runner():
+            try:
+                async with self._slots:
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    job.result = await run()
+                if is_success(job.result):
+                    job.status = SUCCEEDED
+                else:
+                    job.status = FAILED
+                    job.error = next(
+                        (part.get("text") for part in job.result.get("content", []) if part.get("type") == "text"),
+                        "Job failed"
+                    )
+                    # Only the error is reported for failed jobs
+                    job.result = None
+            except asyncio.CancelledError:
+                job.status = FAILED
+                job.error = "Job cancelled"
+                raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._keep_result(job)
+
+        job.task = asyncio.create_task(runner())
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    async def aclose(self):
+        """Cancel jobs that are still queued or running"""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        self._purge()
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            "jobs": len(self._jobs),
+            "max_jobs": self.max_jobs,
+            "max_concurrent": self.max_concurrent,
+            "result_bytes": self.result_bytes,
+            "max_result_bytes": self.max_result_bytes,
+            "evicted": self.evicted,
+            **counts
+        }
+
+
+def job_store_from_env() -> JobStore:
+    """Create a JobStore from environment variables"""
+    return JobStore(
+        max_jobs=int(os.getenv("JOB_STORE_MAX_JOBS", "1000")),
+        ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", "3600")),
+        max_concurrent=int(os.getenv("JOB_MAX_CONCURRENT", "8")),
+        max_result_bytes=int(os.getenv("JOB_STORE_MAX_RESULT_MB", "512")) * 1024 * 1024
+    )
@@ -0,0 +1,132 @@
+"""
+Load balancing across multiple Azure deployments
+
+Each call goes to a healthy endpoint chosen with probability inversely
+proportional to its expected cost, computed from its outstanding requests,
+an EWMA of its latency and its configured weight. Idle, fast, heavily
+weighted endpoints get most traffic while the others keep being sampled.
+Endpoints that fail repeatedly are ejected for a while, and endpoints
+whose own circuit breaker is open are skipped until it lets probes through.
+"""
+
+import random
+import time
+from typing import Any, Iterable, Optional
+
+from circuit_breaker import CircuitBreaker
+
+
+class Endpoint:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        deployment_name: str,
+        weight: float = 1.0,
+        name: Optional[str] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.deployment_name = deployment_name
+        self.weight = weight if weight > 0 else 1.0
+        self.name = name or f"{self.base_url}/{deployment_name}"
+        # Fails calls to this deployment immediately while it is unhealthy
+        self.breaker = breaker
+
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def url_for(self, path: str) -> str:
+        return f"{self.base_url}/openai/deployments/{self.deployment_name}/{path}"
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def is_available(self, now: float) -> bool:
+        return not self.is_ejected(now) and (self.breaker is None or self.breaker.allows_call())
+
+    def stats(self, now: float) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "ewma_latency_seconds": round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            "ejected": self.is_ejected(now),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "circuit_breaker": self.breaker.stats() if self.breaker is not None else None,
+        }
+
+
+class EndpointBalancer:
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        ewma_alpha: float = 0.3,
+        eject_after_failures: int = 5,
+        eject_seconds: float = 30.0
+    ):
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = endpoints
+        self.ewma_alpha = ewma_alpha
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+
+    def _cost(self, endpoint: Endpoint, default_latency: float) -> float:
+        latency = endpoint.ewma_latency if endpoint.ewma_latency is not None else default_latency
+        return (endpoint.outstanding + 1) * latency / endpoint.weight
+
+    def pick(self, exclude: Iterable[Endpoint] = ()) -> Endpoint:
+        """Choose a healthy endpoint weighted by inverse cost, preferring ones not already tried"""
+        now = time.monotonic()
+        excluded = set(id(endpoint) for endpoint in exclude)
+        healthy = [e for e in self.endpoints if e.is_available(now)]
+        candidates = [e for e in healthy if id(e) not in excluded] or healthy
+        if not candidates:
+            # Everything is ejected or open: fail open to the endpoint that returns
+            # soonest, whose breaker rejects the call if its circuit is still open
+            return min(self.endpoints, key=lambda e: e.ejected_until)
+        # Untried endpoints are costed at the best known latency so they get traffic
+        known = [e.ewma_latency for e in self.endpoints if e.ewma_latency is not None]
+        default_latency = min(known) if known else 1.0
+        if len(candidates) == 1:
+            return candidates[0]
+        scores = [1.0 / max(self._cost(e, default_latency), 1e-6) for e in candidates]
+        return random.choices(candidates, weights=scores)[0]
+
+    def start(self, endpoint: Endpoint):
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+
+    def finish(self, endpoint: Endpoint, failed: bool, duration: float):
+        endpoint.outstanding = max(0, endpoint.outstanding - 1)
+        if failed:
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.eject_after_failures:
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                endpoint.ejections += 1
+                # One more failure after readmission ejects it again
+                endpoint.consecutive_failures = self.eject_after_failures - 1
+            return
+        endpoint.consecutive_failures = 0
+        if endpoint.ewma_latency is None:
+            endpoint.ewma_latency = duration
+        else:
+            endpoint.ewma_latency += self.ewma_alpha * (duration - endpoint.ewma_latency)
+
+    def cancel(self, endpoint: Endpoint):
+        """Release an endpoint whose call was cancelled before completing"""
+        endpoint.outstanding = max(0, endpoint.outstanding - 1)
+
+    def stats(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        return [endpoint.stats(now) for endpoint in self.endpoints]
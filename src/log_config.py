@@ -0,0 +1,122 @@
+"""
+Queue-based logging
+
+Log calls only put records on an in-memory queue; a QueueListener thread
+writes them to the log file and stderr, so request handlers never block
+the event loop on log I/O. Supports a JSON line format, per-request
+sampling of INFO lines and prompt truncation.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Iterator, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Whether INFO lines of the request being handled are logged, None outside requests
+_request_sampled: ContextVar[Optional[bool]] = ContextVar("request_sampled", default=None)
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RequestSamplingFilter(logging.Filter):
+    """Drop INFO and lower records of requests that were not sampled"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or _request_sampled.get() is not False
+
+
+@contextmanager
+def sampled_request_logs() -> Iterator[bool]:
+    """Decide once per request whether its INFO lines are logged
+
+    Warnings and errors are always logged. LOG_REQUEST_SAMPLE_RATE is the
+    fraction of requests whose INFO lines are kept (default 1.0).
+    """
+    rate = float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "1.0"))
+    sampled = rate >= 1.0 or random.random() < rate
+    token = _request_sampled.set(sampled)
+    try:
+        yield sampled
+    finally:
+        _request_sampled.reset(token)
+
+
+def truncate_prompt(prompt: str) -> str:
+    """Shorten a prompt for logging to LOG_PROMPT_MAX_CHARS characters (0 keeps it whole)"""
+    max_chars = int(os.getenv("LOG_PROMPT_MAX_CHARS", "200"))
+    if not isinstance(prompt, str) or max_chars <= 0 or len(prompt) <= max_chars:
+        return prompt
+    return f"{prompt[:max_chars]}... ({len(prompt)} chars)"
+
+
+def configure_logging(name: str, level: int = logging.INFO):
+    """Send all logging through a queue drained by a background thread
+
+    Records go to logs/<name>_<date>.log and stderr. LOG_FORMAT=json writes
+    JSON lines instead of plain text.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_dir = Path("logs")
+    log_dir.mkdir(exist_ok=True)
+    log_file = log_dir / f"{name}_{datetime.now().strftime('%Y%m%d')}.log"
+
+    if os.getenv("LOG_FORMAT", "text").strip().lower() == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    stream_handler = logging.StreamHandler(sys.stderr)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestSamplingFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -10,7 +10,6 @@ import base64
 import os
 import sys
 import logging
-from datetime import datetime
 from typing import Any
 from pathlib import Path
 
@@ -30,7 +29,11 @@ except ImportError as e:
 sys.path.insert(0, str(Path(__file__).parent))
 
 try:
+    from azure_config import generator_from_env, get_azure_config
     from azure_image_client import AzureImageGenerator
+    from image_workers import image_workers_from_env
+    from log_config import configure_logging, sampled_request_logs, truncate_prompt
+    from tracing import setup_tracing, shutdown_tracing
 except ImportError as e:
     print(f"Error: Cannot import azure_image_client: {e}", file=sys.stderr)
     print("Please ensure azure_image_client.py is in the same directory", file=sys.stderr)
@@ -70,19 +73,7 @@ def _patch_anyio_memory_stream_factory() -> bool:
 # Set up logging
 def setup_logging():
     """Setup logging configuration"""
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    log_file = log_dir / f"mcp_server_{datetime.now().strftime('%Y%m%d')}.log"
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler(sys.stderr)
-        ]
-    )
+    configure_logging("mcp_server")
     return logging.getLogger(__name__)
 
 logger = setup_logging()
@@ -94,63 +85,6 @@ if _patch_anyio_memory_stream_factory():
 server = Server("azure-image-editor")
 
 
-def get_azure_config():
-    """Get Azure configuration from environment variables"""
-    try:
-        required_vars = {
-            "AZURE_BASE_URL": "Base URL for Azure AI service",
-            "AZURE_API_KEY": "API key for Azure AI service", 
-            "AZURE_DEPLOYMENT_NAME": "Deployment model name"
-        }
-        
-        missing_vars = []
-        config = {}
-        
-        for var_name, description in required_vars.items():
-            value = os.getenv(var_name)
-            if not value or not value.strip():
-                missing_vars.append(f"{var_name} ({description})")
-            else:
-                key_map = {
-                    "AZURE_BASE_URL": "base_url",
-                    "AZURE_API_KEY": "api_key",
-                    "AZURE_DEPLOYMENT_NAME": "deployment_name"
-                }
-                config[key_map[var_name]] = value.strip()
-        
-        # Handle optional variables
-        model_value = os.getenv("AZURE_MODEL")
-        config["model"] = model_value.strip() if model_value and model_value.strip() else "flux.1-kontext-pro"
-        
-        api_version_value = os.getenv("AZURE_API_VERSION")
-        config["api_version"] = api_version_value.strip() if api_version_value and api_version_value.strip() else "2025-04-01-preview"
-        
-        if missing_vars:
-            error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
-            logger.error(error_msg)
-            raise ValueError(error_msg)
-        
-        # Basic validation
-        if not config["base_url"].startswith(("http://", "https://")):
-            raise ValueError("AZURE_BASE_URL must be a valid HTTP/HTTPS URL")
-        
-        if len(config["api_key"]) < 10:
-            raise ValueError("AZURE_API_KEY is too short, please check if the API key is correct")
-        
-        if not config["deployment_name"]:
-            raise ValueError("AZURE_DEPLOYMENT_NAME cannot be empty")
-        
-        logger.info("Azure configuration loaded successfully")
-        return config
-        
-    except ValueError:
-        raise
-    except Exception as e:
-        error_msg = f"Error loading Azure configuration: {str(e)}"
-        logger.error(error_msg)
-        raise Exception(error_msg)
-
-
 def is_english_text(text: str) -> bool:
     """Check if text is primarily in English"""
     if not text.strip():
@@ -167,12 +101,66 @@ def is_english_text(text: str) -> bool:
     return True
 
 
+MAX_IMAGES_PER_REQUEST = 10
+
+
 def validate_image_size(size: str) -> bool:
     """Validate image size format"""
     supported_sizes = ["1024x1024", "1792x1024", "1024x1792"]
     return size in supported_sizes
 
 
+def validate_image_count(n: Any) -> bool:
+    """Validate number of images per generation request"""
+    return isinstance(n, int) and not isinstance(n, bool) and 1 <= n <= MAX_IMAGES_PER_REQUEST
+
+
+def validate_output_paths(output_paths: Any) -> bool:
+    """Validate that output_paths, when given, is a list of non-empty strings"""
+    if output_paths is None:
+        return True
+    return isinstance(output_paths, list) and all(isinstance(path, str) and path for path in output_paths)
+
+
+def expand_output_paths(output_path: str | None, output_paths: list[str] | None, n: int) -> list[str]:
+    """Resolve per-index output paths, deriving name_1.png, name_2.png, ... from a single path"""
+    if output_paths:
+        return list(output_paths)[:n]
+    if not output_path:
+        return []
+    path = Path(output_path)
+    return [output_path] + [str(path.with_name(f"{path.stem}_{i}{path.suffix}")) for i in range(1, n)]
+
+
+# Process-wide generator shared by all tool calls, so the Azure connection
+# pool (DNS, TCP and TLS setup) is reused instead of rebuilt per request
+_generator: AzureImageGenerator | None = None
+
+# Thread or process pool for PIL work, kept off the event loop
+_image_workers = image_workers_from_env()
+
+
+def get_generator(azure_config: dict[str, str]) -> AzureImageGenerator:
+    """Get the shared AzureImageGenerator, creating it on first use"""
+    global _generator
+    if _generator is None or _generator.is_closed:
+        _generator = generator_from_env(
+            azure_config,
+            image_workers=_image_workers
+        )
+        logger.info("Created shared Azure image generator")
+    return _generator
+
+
+async def close_generator():
+    """Close the shared AzureImageGenerator and its connection pool"""
+    global _generator
+    if _generator is not None:
+        await _generator.aclose()
+        _generator = None
+        logger.info("Closed shared Azure image generator")
+
+
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """List available tools"""
@@ -196,9 +184,21 @@ async def handle_list_tools() -> list[types.Tool]:
                         "default": default_size,
                         "enum": ["1024x1024", "1792x1024", "1024x1792"]
                     },
+                    "n": {
+                        "type": "integer",
+                        "description": f"Number of images to generate in one request (1-{MAX_IMAGES_PER_REQUEST}), default: 1",
+                        "default": 1,
+                        "minimum": 1,
+                        "maximum": MAX_IMAGES_PER_REQUEST
+                    },
                     "output_path": {
                         "type": "string",
-                        "description": "absolute output file path"
+                        "description": "absolute output file path, with n > 1 extra images are saved as <name>_1, <name>_2, ..."
+                    },
+                    "output_paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional absolute output file paths, one per image, overrides output_path"
                     }
                 },
                 "required": ["prompt", "size", "output_path"]
@@ -230,6 +230,44 @@ async def handle_list_tools() -> list[types.Tool]:
                 },
                 "required": ["image_path", "prompt", "size", "output_path"]
             },
+        ),
+        types.Tool(
+            name="generate_images_batch",
+            description="Generate many images concurrently from a list of prompts (English prompts only). Each item succeeds or fails independently.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "items": {
+                        "type": "array",
+                        "description": "Generation requests to run",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "prompt": {
+                                    "type": "string",
+                                    "description": "English description for image generation"
+                                },
+                                "size": {
+                                    "type": "string",
+                                    "description": f"Image size, default: {default_size}",
+                                    "enum": ["1024x1024", "1792x1024", "1024x1792"]
+                                },
+                                "output_path": {
+                                    "type": "string",
+                                    "description": "absolute output file path"
+                                }
+                            },
+                            "required": ["prompt", "output_path"]
+                        }
+                    },
+                    "max_concurrency": {
+                        "type": "integer",
+                        "description": "Optional: maximum number of items generated at once, capped by the server limit",
+                        "minimum": 1
+                    }
+                },
+                "required": ["items"]
+            },
         )
     ]
 
@@ -239,21 +277,24 @@ async def handle_call_tool(
     name: str, arguments: dict[str, Any] | None
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Handle tool calls"""
-    try:
-        if name == "generate_image":
-            return await handle_generate_image(arguments or {})
-        elif name == "edit_image":
-            return await handle_edit_image(arguments or {})
-        else:
-            return [types.TextContent(
-                type="text",
-                text=f"Error: Unknown tool '{name}'"
-            )]
+    with sampled_request_logs():
+        try:
+            if name == "generate_image":
+                return await handle_generate_image(arguments or {})
+            elif name == "edit_image":
+                return await handle_edit_image(arguments or {})
+            elif name == "generate_images_batch":
+                return await handle_generate_images_batch(arguments or {})
+            else:
+                return [types.TextContent(
+                    type="text",
+                    text=f"Error: Unknown tool '{name}'"
+                )]
             
-    except Exception as e:
-        error_msg = f"Unexpected error in tool '{name}': {str(e)}"
-        logger.error(error_msg)
-        return [types.TextContent(type="text", text=error_msg)]
+        except Exception as e:
+            error_msg = f"Unexpected error in tool '{name}': {str(e)}"
+            logger.error(error_msg)
+            return [types.TextContent(type="text", text=error_msg)]
 
 
 async def handle_generate_image(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent]:
@@ -261,9 +302,11 @@ async def handle_generate_image(arguments: dict[str, Any]) -> list[types.TextCon
     try:
         prompt = arguments.get("prompt", "")
         size = arguments.get("size", os.getenv("DEFAULT_IMAGE_SIZE", "1024x1024"))
+        n = arguments.get("n", 1)
         output_path = arguments.get("output_path")
+        output_paths = arguments.get("output_paths")
         
-        logger.info(f"Image generation request: prompt='{prompt}', size={size}, output_path={output_path}")
+        logger.info(f"Image generation request: prompt='{truncate_prompt(prompt)}', size={size}, n={n}, output_path={output_path}")
         
         # Get Azure configuration
         try:
@@ -276,7 +319,7 @@ async def handle_generate_image(arguments: dict[str, Any]) -> list[types.TextCon
         # Validate prompt is in English
         if not is_english_text(prompt):
             error_msg = "Prompt must be in English. Please use English to describe the image you want to generate."
-            logger.warning(f"Non-English prompt rejected: '{prompt}'")
+            logger.warning(f"Non-English prompt rejected: '{truncate_prompt(prompt)}'")
             return [types.TextContent(type="text", text=error_msg)]
         
         # Validate image size
@@ -285,37 +328,126 @@ async def handle_generate_image(arguments: dict[str, Any]) -> list[types.TextCon
             logger.warning(f"Invalid image size: {size}")
             return [types.TextContent(type="text", text=error_msg)]
         
-        async with AzureImageGenerator(
-            base_url=azure_config["base_url"],
-            api_key=azure_config["api_key"],
-            deployment_name=azure_config["deployment_name"],
-            model=azure_config["model"],
-            api_version=azure_config["api_version"]
-        ) as generator:
-            
-            result = await generator.generate_image(
-                prompt=prompt,
-                size=size,
-                output_path=output_path
-            )
-            
-            if output_path:
-                logger.info(f"Image saved to file: {result}")
-                return [types.TextContent(type="text", text=f"Image successfully generated and saved to: {result}")]
-            else:
-                image_b64 = base64.b64encode(result).decode('utf-8')
-                logger.info(f"Image generation successful, returning base64 data (size: {len(result)} bytes)")
-                return [
-                    types.TextContent(type="text", text=f"Image generation successful, prompt: '{prompt}', size: {size}"),
-                    types.ImageContent(type="image", data=image_b64, mimeType="image/png")
-                ]
-                
+        # Validate image count
+        if not validate_image_count(n):
+            error_msg = f"Unsupported image count: {n}. n must be an integer between 1 and {MAX_IMAGES_PER_REQUEST}"
+            logger.warning(f"Invalid image count: {n}")
+            return [types.TextContent(type="text", text=error_msg)]
+
+        # Validate output paths
+        if not validate_output_paths(output_paths):
+            error_msg = "Invalid output_paths: must be a list of non-empty file path strings"
+            logger.warning(f"Invalid output_paths: {output_paths!r}")
+            return [types.TextContent(type="text", text=error_msg)]
+        if output_path is not None and not (isinstance(output_path, str) and output_path):
+            error_msg = "Invalid output_path: must be a non-empty file path string"
+            logger.warning(f"Invalid output_path: {output_path!r}")
+            return [types.TextContent(type="text", text=error_msg)]
+        
+        generator = get_generator(azure_config)
+
+        results = await generator.generate_images(
+            prompt=prompt,
+            size=size,
+            n=n,
+            output_paths=expand_output_paths(output_path, output_paths, n)
+        )
+
+        # Saved images come back as paths, unsaved ones as bytes
+        saved = [result for result in results if isinstance(result, str)]
+        images = [result for result in results if not isinstance(result, str)]
+        content = []
+        if saved:
+            logger.info(f"Image saved to file: {', '.join(saved)}")
+            content.append(types.TextContent(type="text", text=f"Image successfully generated and saved to: {', '.join(saved)}"))
+        if images:
+            logger.info(f"Image generation successful, returning {len(images)} image(s) as base64 data (size: {sum(len(b) for b in images)} bytes)")
+            content.append(types.TextContent(type="text", text=f"Image generation successful, prompt: '{prompt}', size: {size}"))
+            for image_bytes in images:
+                content.append(types.ImageContent(type="image", data=base64.b64encode(image_bytes).decode('utf-8'), mimeType="image/png"))
+        return content
+
     except Exception as e:
         error_msg = f"Error generating image: {str(e)}"
         logger.error(f"Image generation failed: {error_msg}")
         return [types.TextContent(type="text", text=error_msg)]
 
 
+async def handle_generate_images_batch(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent]:
+    """Handle batch image generation request"""
+    try:
+        items = arguments.get("items")
+        server_limit = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+        max_items = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+        
+        if not isinstance(items, list) or not items:
+            error_msg = "'items' must be a non-empty list of generation requests"
+            logger.error(error_msg)
+            return [types.TextContent(type="text", text=error_msg)]
+        
+        if len(items) > max_items:
+            error_msg = f"Too many batch items: {len(items)}. Maximum is {max_items}"
+            logger.warning(error_msg)
+            return [types.TextContent(type="text", text=error_msg)]
+        
+        try:
+            max_concurrency = max(1, min(int(arguments.get("max_concurrency", server_limit)), server_limit))
+        except (TypeError, ValueError):
+            error_msg = f"Invalid max_concurrency: {arguments.get('max_concurrency')}"
+            logger.warning(error_msg)
+            return [types.TextContent(type="text", text=error_msg)]
+        
+        logger.info(f"Batch generation request: {len(items)} items, max_concurrency={max_concurrency}")
+        
+        # Report each finished item as a progress notification when the client asked for progress
+        ctx = server.request_context
+        progress_token = ctx.meta.progressToken if ctx.meta else None
+        semaphore = asyncio.Semaphore(max_concurrency)
+        completed = 0
+        
+        async def run_item(index: int, item: Any) -> list[types.TextContent | types.ImageContent]:
+            nonlocal completed
+            async with semaphore:
+                if not isinstance(item, dict):
+                    content = [types.TextContent(type="text", text="Error: batch item must be an object")]
+                else:
+                    item_arguments = {"prompt": item.get("prompt", "")}
+                    if item.get("size"):
+                        item_arguments["size"] = item["size"]
+                    if item.get("output_path"):
+                        item_arguments["output_path"] = item["output_path"]
+                    content = await handle_generate_image(item_arguments)
+            completed += 1
+            logger.info(f"Batch item {index} finished ({completed}/{len(items)})")
+            if progress_token is not None:
+                # Only progress and total, the message argument needs a newer mcp than requirements.txt allows
+                await ctx.session.send_progress_notification(progress_token, completed, total=len(items))
+            return content
+        
+        results = await asyncio.gather(*(run_item(i, item) for i, item in enumerate(items)))
+        
+        content = []
+        succeeded = 0
+        for index, item_content in enumerate(results):
+            # Items saved to output_path report success in text, without image data
+            ok = any(
+                part.type == "image" or part.text.startswith("Image successfully generated")
+                for part in item_content
+            )
+            succeeded += ok
+            content.append(types.TextContent(type="text", text=f"[item {index}] {'succeeded' if ok else 'failed'}"))
+            content.extend(item_content)
+        
+        summary = f"Batch generation finished: {succeeded}/{len(items)} succeeded"
+        logger.info(summary)
+        return [types.TextContent(type="text", text=summary)] + content
+        
+    except Exception as e:
+        error_msg = f"Error in batch generation: {str(e)}"
+        logger.error(f"Batch generation failed: {error_msg}")
+        return [types.TextContent(type="text", text=error_msg)]
+
+
 async def handle_edit_image(arguments: dict[str, Any]) -> list[types.TextContent | types.ImageContent]:
     """Handle image editing request"""
     try:
@@ -330,7 +462,7 @@ async def handle_edit_image(arguments: dict[str, Any]) -> list[types.TextContent
             logger.error(error_msg)
             return [types.TextContent(type="text", text=error_msg)]
         
-        logger.info(f"Image editing request: image_path='{image_path}', prompt='{prompt}', output_path={output_path}")
+        logger.info(f"Image editing request: image_path='{image_path}', prompt='{truncate_prompt(prompt)}', output_path={output_path}")
         
         # Get Azure configuration
         try:
@@ -343,7 +475,7 @@ async def handle_edit_image(arguments: dict[str, Any]) -> list[types.TextContent
         # Validate prompt is in English
         if not is_english_text(prompt):
             error_msg = "Prompt must be in English. Please use English to describe how you want to edit the image."
-            logger.warning(f"Non-English prompt rejected: '{prompt}'")
+            logger.warning(f"Non-English prompt rejected: '{truncate_prompt(prompt)}'")
             return [types.TextContent(type="text", text=error_msg)]
         
         # Check if input file exists
@@ -352,32 +484,26 @@ async def handle_edit_image(arguments: dict[str, Any]) -> list[types.TextContent
             logger.error(f"Input file does not exist: {image_path}")
             return [types.TextContent(type="text", text=error_msg)]
         
-        async with AzureImageGenerator(
-            base_url=azure_config["base_url"],
-            api_key=azure_config["api_key"],
-            deployment_name=azure_config["deployment_name"],
-            model=azure_config["model"],
-            api_version=azure_config["api_version"]
-        ) as generator:
-            
-            result = await generator.edit_image(
-                image_path=image_path,
-                prompt=prompt,
-                size=size,
-                output_path=output_path
-            )
-            
-            if output_path:
-                logger.info(f"Edited image saved to file: {result}")
-                return [types.TextContent(type="text", text=f"Image successfully edited and saved to: {result}")]
-            else:
-                image_b64 = base64.b64encode(result).decode('utf-8')
-                logger.info(f"Image editing successful, returning base64 data (size: {len(result)} bytes)")
-                return [
-                    types.TextContent(type="text", text=f"Image editing successful, edit prompt: '{prompt}', source file: {image_path}"),
-                    types.ImageContent(type="image", data=image_b64, mimeType="image/png")
-                ]
-                
+        generator = get_generator(azure_config)
+
+        result = await generator.edit_image(
+            image_path=image_path,
+            prompt=prompt,
+            size=size,
+            output_path=output_path
+        )
+
+        if output_path:
+            logger.info(f"Edited image saved to file: {result}")
+            return [types.TextContent(type="text", text=f"Image successfully edited and saved to: {result}")]
+        else:
+            image_b64 = base64.b64encode(result).decode('utf-8')
+            logger.info(f"Image editing successful, returning base64 data (size: {len(result)} bytes)")
+            return [
+                types.TextContent(type="text", text=f"Image editing successful, edit prompt: '{prompt}', source file: {image_path}"),
+                types.ImageContent(type="image", data=image_b64, mimeType="image/png")
+            ]
+
     except Exception as e:
         error_msg = f"Error editing image: {str(e)}"
         logger.error(f"Image editing failed: {error_msg}")
@@ -395,6 +521,8 @@ async def main():
         logger.info(f"   - Deployment name: {azure_config['deployment_name']}")
         logger.info(f"   - Model: {azure_config['model']}")
         logger.info(f"   - API key: {'*' * (len(azure_config['api_key']) - 4) + azure_config['api_key'][-4:]}")
+        if len(azure_config["endpoints"]) > 1:
+            logger.info(f"   - Load balancing across {len(azure_config['endpoints'])} deployments")
     except (ValueError, Exception) as e:
         logger.error(f"❌ Azure configuration verification failed: {str(e)}")
         logger.error("Please set the following required environment variables:")
@@ -428,6 +556,9 @@ async def main():
         logger.exception("Failed to compute server capabilities")
         raise
 
+    setup_tracing("azure-image-editor-stdio")
+    get_generator(azure_config)
+
     try:
         logger.info("Creating STDIO server...")
         async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
@@ -445,6 +576,10 @@ async def main():
     except Exception:
         logger.exception("Error in server setup")
         raise
+    finally:
+        await close_generator()
+        _image_workers.shutdown()
+        shutdown_tracing()
 
 
 if __name__ == "__main__":
@@ -12,14 +12,16 @@ import os
 import sys
 import logging
 import json
-from datetime import datetime
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import Any
 from pathlib import Path
 
 try:
     from starlette.applications import Starlette
     from starlette.routing import Route
-    from starlette.responses import JSONResponse, Response
+    from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
     from starlette.requests import Request
     import uvicorn
     from dotenv import load_dotenv
@@ -32,7 +34,18 @@ except ImportError as e:
 sys.path.insert(0, str(Path(__file__).parent))
 
 try:
+    from azure_config import generator_from_env, get_azure_config
     from azure_image_client import AzureImageGenerator
+    from admission import QueueFullError
+    from circuit_breaker import CircuitOpenError
+    from image_header import check_image_limits, sniff_image
+    from image_store import DIGEST_PATTERN, StoredImage, image_store_from_env, parse_resource_uri
+    from image_workers import image_workers_from_env, inspect_image, inspect_image_header, make_thumbnail
+    from job_store import SUCCEEDED, JobStoreFullError, job_store_from_env
+    from metrics import ADMISSION_QUEUE_DEPTH, CONTENT_TYPE, IMAGE_WORKERS_ACTIVE, IMAGE_WORKERS_QUEUE_DEPTH, REGISTRY, TOOL_CALLS, TOOL_CALLS_IN_FLIGHT
+    from log_config import configure_logging, sampled_request_logs, truncate_prompt
+    from tracing import current_span, end_span, set_span_attributes, setup_tracing, shutdown_tracing, start_span, traced_phase
+    from upload_store import UploadStoreFullError, UploadTooLargeError, upload_store_from_env
 except ImportError as e:
     print(f"Error: Cannot import azure_image_client: {e}", file=sys.stderr)
     print("Please ensure azure_image_client.py is in the same directory", file=sys.stderr)
@@ -44,81 +57,12 @@ load_dotenv()
 # Set up logging
 def setup_logging():
     """Setup logging configuration"""
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    log_file = log_dir / f"mcp_server_http_{datetime.now().strftime('%Y%m%d')}.log"
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler(sys.stderr)
-        ]
-    )
+    configure_logging("mcp_server_http")
     return logging.getLogger(__name__)
 
 logger = setup_logging()
 
 
-def get_azure_config():
-    """Get Azure configuration from environment variables"""
-    try:
-        required_vars = {
-            "AZURE_BASE_URL": "Base URL for Azure AI service",
-            "AZURE_API_KEY": "API key for Azure AI service", 
-            "AZURE_DEPLOYMENT_NAME": "Deployment model name"
-        }
-        
-        missing_vars = []
-        config = {}
-        
-        for var_name, description in required_vars.items():
-            value = os.getenv(var_name)
-            if not value or not value.strip():
-                missing_vars.append(f"{var_name} ({description})")
-            else:
-                key_map = {
-                    "AZURE_BASE_URL": "base_url",
-                    "AZURE_API_KEY": "api_key",
-                    "AZURE_DEPLOYMENT_NAME": "deployment_name"
-                }
-                config[key_map[var_name]] = value.strip()
-        
-        # Handle optional variables
-        model_value = os.getenv("AZURE_MODEL")
-        config["model"] = model_value.strip() if model_value and model_value.strip() else "flux.1-kontext-pro"
-        
-        api_version_value = os.getenv("AZURE_API_VERSION")
-        config["api_version"] = api_version_value.strip() if api_version_value and api_version_value.strip() else "2025-04-01-preview"
-        
-        if missing_vars:
-            error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
-            logger.error(error_msg)
-            raise ValueError(error_msg)
-        
-        # Basic validation
-        if not config["base_url"].startswith(("http://", "https://")):
-            raise ValueError("AZURE_BASE_URL must be a valid HTTP/HTTPS URL")
-        
-        if len(config["api_key"]) < 10:
-            raise ValueError("AZURE_API_KEY is too short, please check if the API key is correct")
-        
-        if not config["deployment_name"]:
-            raise ValueError("AZURE_DEPLOYMENT_NAME cannot be empty")
-        
-        logger.info("Azure configuration loaded successfully")
-        return config
-        
-    except ValueError:
-        raise
-    except Exception as e:
-        error_msg = f"Error loading Azure configuration: {str(e)}"
-        logger.error(error_msg)
-        raise Exception(error_msg)
-
-
 def is_english_text(text: str) -> bool:
     """Check if text is primarily in English"""
     if not text.strip():
@@ -135,80 +79,326 @@ def is_english_text(text: str) -> bool:
     return True
 
 
+MAX_IMAGES_PER_REQUEST = 10
+
+
 def validate_image_size(size: str) -> bool:
     """Validate image size format"""
     supported_sizes = ["1024x1024", "1792x1024", "1024x1792"]
     return size in supported_sizes
 
 
+def validate_image_count(n: Any) -> bool:
+    """Validate number of images per generation request"""
+    return isinstance(n, int) and not isinstance(n, bool) and 1 <= n <= MAX_IMAGES_PER_REQUEST
+
+
+def validate_output_paths(output_paths: Any) -> bool:
+    """Validate that output_paths, when given, is a list of non-empty strings"""
+    if output_paths is None:
+        return True
+    return isinstance(output_paths, list) and all(isinstance(path, str) and path for path in output_paths)
+
+
+def expand_output_paths(output_path: str | None, output_paths: list[str] | None, n: int) -> list[str]:
+    """Resolve per-index output paths, deriving name_1.png, name_2.png, ... from a single path"""
+    if output_paths:
+        return list(output_paths)[:n]
+    if not output_path:
+        return []
+    path = Path(output_path)
+    return [output_path] + [str(path.with_name(f"{path.stem}_{i}{path.suffix}")) for i in range(1, n)]
+
+
+# Process-wide generator shared by all tool calls, so the Azure connection
+# pool (DNS, TCP and TLS setup) is reused instead of rebuilt per request
+_generator: AzureImageGenerator | None = None
+
+# Thread or process pool for PIL work, kept off the event loop
+_image_workers = image_workers_from_env()
+
+# Result images served from /images/{digest} and as MCP resources,
+# None to return them inline as base64
+_image_store = image_store_from_env()
+
+# Images POSTed to /uploads, passed to edit_image by upload_id
+_upload_store = upload_store_from_env()
+
+# Base URL for links to /images, from PUBLIC_BASE_URL or the request being handled
+_public_base_url: ContextVar[str] = ContextVar("public_base_url", default="")
+
+# Protocol version from the MCP-Protocol-Version header of the request being
+# handled; clients that omit it are assumed to speak 2025-03-26
+_protocol_version: ContextVar[str] = ContextVar("protocol_version", default="2025-03-26")
+
+
+def get_generator(azure_config: dict[str, str]) -> AzureImageGenerator:
+    """Get the shared AzureImageGenerator, creating it on first use"""
+    global _generator
+    if _generator is None or _generator.is_closed:
+        _generator = generator_from_env(
+            azure_config,
+            image_workers=_image_workers,
+            write_behind=os.getenv("OUTPUT_WRITE_BEHIND", "false").strip().lower() in ("1", "true", "yes")
+        )
+        logger.info("Created shared Azure image generator")
+    return _generator
+
+
+async def close_generator():
+    """Close the shared AzureImageGenerator and its connection pool"""
+    global _generator
+    if _generator is not None:
+        await _generator.aclose()
+        _generator = None
+        logger.info("Closed shared Azure image generator")
+
+
 async def get_tools_list():
     """Get list of available tools"""
     default_size = os.getenv("DEFAULT_IMAGE_SIZE", "1024x1024")
     
-    return {
-        "tools": [
-            {
-                "name": "generate_image",
-                "description": "Generate images from text prompts using Azure AI Foundry (English prompts only)",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "prompt": {
-                            "type": "string",
-                            "description": "English description for image generation",
-                        },
-                        "size": {
-                            "type": "string",
-                            "description": f"Image size, supports 1024x1024, 1792x1024, 1024x1792, default: {default_size}",
-                            "default": default_size,
-                            "enum": ["1024x1024", "1792x1024", "1024x1792"]
-                        },
-                        "output_path": {
-                            "type": "string",
-                            "description": "Optional: output file path (for server-side save). Image data is always returned to client."
-                        }
+    tools = [
+        {
+            "name": "generate_image",
+            "description": "Generate images from text prompts using Azure AI Foundry (English prompts only)",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "prompt": {
+                        "type": "string",
+                        "description": "English description for image generation",
+                    },
+                    "size": {
+                        "type": "string",
+                        "description": f"Image size, supports 1024x1024, 1792x1024, 1024x1792, default: {default_size}",
+                        "default": default_size,
+                        "enum": ["1024x1024", "1792x1024", "1024x1792"]
+                    },
+                    "n": {
+                        "type": "integer",
+                        "description": f"Number of images to generate in one request (1-{MAX_IMAGES_PER_REQUEST}), default: 1",
+                        "default": 1,
+                        "minimum": 1,
+                        "maximum": MAX_IMAGES_PER_REQUEST
+                    },
+                    "output_path": {
+                        "type": "string",
+                        "description": "Optional: output file path (for server-side save). With n > 1, extra images are saved as <name>_1, <name>_2, ... Image data is always returned to client."
+                    },
+                    "output_paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional: per-image output file paths (for server-side save), overrides output_path"
+                    }
+                },
+                "required": ["prompt", "size"]
+            },
+        },
+        {
+            "name": "edit_image",
+            "description": "Edit an existing image with intelligent dimension preservation. Pass the image as base64, or POST its bytes to /uploads first and pass the returned upload_id.",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "image_data_base64": {
+                        "type": "string",
+                        "description": "Base64 encoded image data. Supports both raw base64 (iVBORw0K...) and Data URL format (data:image/png;base64,iVBORw0K...)"
+                    },
+                    "upload_id": {
+                        "type": "string",
+                        "description": "Id returned by POST /uploads, used instead of image_data_base64"
                     },
-                    "required": ["prompt", "size"]
+                    "prompt": {
+                        "type": "string",
+                        "description": "English description of how to edit the image"
+                    },
+                    "size": {
+                        "type": "string",
+                        "description": "Optional size for edited image, if not specified uses original image dimensions",
+                        "enum": ["1024x1024", "1792x1024", "1024x1792"]
+                    },
+                    "output_path": {
+                        "type": "string",
+                        "description": "Optional: output file path (for server-side save). Image data is always returned to client."
+                    }
                 },
+                "required": ["prompt"]
             },
-            {
-                "name": "edit_image",
-                "description": "Edit an existing image with intelligent dimension preservation. Upload image data using base64 encoding.",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "image_data_base64": {
-                            "type": "string",
-                            "description": "Base64 encoded image data. Supports both raw base64 (iVBORw0K...) and Data URL format (data:image/png;base64,iVBORw0K...)"
-                        },
-                        "prompt": {
-                            "type": "string",
-                            "description": "English description of how to edit the image"
-                        },
-                        "size": {
-                            "type": "string",
-                            "description": "Optional size for edited image, if not specified uses original image dimensions",
-                            "enum": ["1024x1024", "1792x1024", "1024x1792"]
-                        },
-                        "output_path": {
-                            "type": "string",
-                            "description": "Optional: output file path (for server-side save). Image data is always returned to client."
+        },
+        {
+            "name": "generate_images_batch",
+            "description": "Generate many images concurrently from a list of prompts (English prompts only). Each item succeeds or fails independently.",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "items": {
+                        "type": "array",
+                        "description": "Generation requests to run",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "prompt": {
+                                    "type": "string",
+                                    "description": "English description for image generation"
+                                },
+                                "size": {
+                                    "type": "string",
+                                    "description": f"Image size, default: {default_size}",
+                                    "enum": ["1024x1024", "1792x1024", "1024x1792"]
+                                },
+                                "output_path": {
+                                    "type": "string",
+                                    "description": "Optional: output file path (for server-side save)"
+                                }
+                            },
+                            "required": ["prompt"]
                         }
                     },
-                    "required": ["image_data_base64", "prompt"]
+                    "max_concurrency": {
+                        "type": "integer",
+                        "description": "Optional: maximum number of items generated at once, capped by the server limit",
+                        "minimum": 1
+                    }
                 },
+                "required": ["items"]
+            },
+        }
+    ]
+
+    # Asynchronous variants take the same arguments and return a job id immediately
+    schemas = {tool["name"]: tool["inputSchema"] for tool in tools}
+    job_id_schema = {
+        "type": "object",
+        "properties": {
+            "job_id": {
+                "type": "string",
+                "description": "Job id returned by submit_generate or submit_edit"
             }
-        ]
+        },
+        "required": ["job_id"]
     }
+    tools += [
+        {
+            "name": "submit_generate",
+            "description": "Start an image generation job in the background and return its job id. Poll with get_job and fetch the images with get_job_result.",
+            "inputSchema": schemas["generate_image"],
+        },
+        {
+            "name": "submit_edit",
+            "description": "Start an image editing job in the background and return its job id. Poll with get_job and fetch the image with get_job_result.",
+            "inputSchema": schemas["edit_image"],
+        },
+        {
+            "name": "get_job",
+            "description": "Get the status of a background job (queued, running, succeeded or failed)",
+            "inputSchema": job_id_schema,
+        },
+        {
+            "name": "get_job_result",
+            "description": "Get the result of a finished background job",
+            "inputSchema": job_id_schema,
+        }
+    ]
+    return {"tools": tools}
+
+
+# Background jobs started by submit_generate / submit_edit
+_job_store = job_store_from_env()
+
+
+# Content types that carry a result image, inline or by link (see image_content)
+IMAGE_CONTENT_TYPES = ("image", "resource", "resource_link")
+
+
+def has_image(result: dict[str, Any]) -> bool:
+    """An image tool result counts as a success if it carries at least one image"""
+    return any(part.get("type") in IMAGE_CONTENT_TYPES for part in result.get("content", []))
+
+
+def handle_submit_job(tool_name: str, arguments: dict[str, Any]):
+    """Start a tool call in the background and return its job id"""
+    try:
+        job = _job_store.submit(tool_name, lambda: call_tool(tool_name, arguments), has_image)
+    except JobStoreFullError as e:
+        logger.warning(f"Rejected {tool_name} job: {e}")
+        return {"content": [{"type": "text", "text": f"Error: {str(e)}"}]}
+
+    logger.info(f"Submitted {tool_name} job {job.id}")
+    return {"content": [{"type": "text", "text": json.dumps(job.summary())}]}
+
+
+def handle_get_job(arguments: dict[str, Any]):
+    """Return the status of a background job"""
+    job_id = arguments.get("job_id", "")
+    job = _job_store.get(job_id)
+    if job is None:
+        return {"content": [{"type": "text", "text": f"Error: Unknown or expired job '{job_id}'"}]}
+    return {"content": [{"type": "text", "text": json.dumps(job.summary())}]}
+
+
+def handle_get_job_result(arguments: dict[str, Any]):
+    """Return the tool result of a finished background job"""
+    job_id = arguments.get("job_id", "")
+    job = _job_store.get(job_id)
+    if job is None:
+        return {"content": [{"type": "text", "text": f"Error: Unknown or expired job '{job_id}'"}]}
+    if not job.done:
+        return {"content": [{"type": "text", "text": f"Job '{job_id}' is still {job.status}, poll get_job until it finishes"}]}
+    if job.status != SUCCEEDED:
+        return {"content": [{"type": "text", "text": f"Job '{job_id}' failed: {job.error}"}]}
+    return job.result
+
+
+TOOL_NAMES = (
+    "generate_image", "edit_image", "generate_images_batch",
+    "submit_generate", "submit_edit", "get_job", "get_job_result"
+)
+IMAGE_TOOLS = ("generate_image", "edit_image", "generate_images_batch")
+
+
+def tool_status(name: str, result: dict[str, Any]) -> str:
+    """Classify a tool result as success or error for metrics"""
+    if name in IMAGE_TOOLS:
+        return "success" if has_image(result) else "error"
+    content = result.get("content", [])
+    if content and content[0].get("type") == "text" and content[0].get("text", "").startswith("Error"):
+        return "error"
+    return "success"
 
 
 async def call_tool(name: str, arguments: dict[str, Any]):
-    """Call a tool by name with arguments"""
+    """Call a tool by name with arguments, recording call metrics"""
+    tool = name if name in TOOL_NAMES else "unknown"
+    with start_span(f"tool {tool}", {"mcp.tool.name": tool}) as span, TOOL_CALLS_IN_FLIGHT.track_inprogress(tool=tool):
+        try:
+            result = await run_tool(name, arguments)
+        except (QueueFullError, CircuitOpenError):
+            TOOL_CALLS.inc(tool=tool, status="rejected")
+            raise
+        status = tool_status(tool, result)
+        set_span_attributes(span, {"mcp.tool.status": status})
+    TOOL_CALLS.inc(tool=tool, status=status)
+    return result
+
+
+async def run_tool(name: str, arguments: dict[str, Any]):
+    """Dispatch a tool call to its handler"""
     try:
         if name == "generate_image":
             return await handle_generate_image(arguments or {})
         elif name == "edit_image":
             return await handle_edit_image(arguments or {})
+        elif name == "generate_images_batch":
+            return await handle_generate_images_batch(arguments or {})
+        elif name == "submit_generate":
+            return handle_submit_job("generate_image", arguments or {})
+        elif name == "submit_edit":
+            return handle_submit_job("edit_image", arguments or {})
+        elif name == "get_job":
+            return handle_get_job(arguments or {})
+        elif name == "get_job_result":
+            return handle_get_job_result(arguments or {})
         else:
             return {
                 "content": [
@@ -216,20 +406,63 @@ async def call_tool(name: str, arguments: dict[str, Any]):
                 ]
             }
             
+    except (QueueFullError, CircuitOpenError):
+        raise
     except Exception as e:
         error_msg = f"Unexpected error in tool '{name}': {str(e)}"
         logger.error(error_msg)
         return {"content": [{"type": "text", "text": error_msg}]}
 
 
+async def image_content(image_bytes: bytes) -> list[dict[str, Any]]:
+    """Tool result content for one image: inline base64, or a link to /images plus a thumbnail
+
+    resource_link content only exists from protocol 2025-06-18, so older
+    clients get the link as a text part next to the same thumbnail.
+    """
+    if _image_store is None:
+        return [inline_image(image_bytes)]
+
+    with traced_phase("image_store"):
+        stored = await _image_store.put(image_bytes)
+    link = resource_entry(stored)
+    # IMAGE_DELIVERY=url links to /images, resource leaves the image:// URI for resources/read
+    if os.getenv("IMAGE_DELIVERY", "inline").strip().lower() == "url":
+        link["uri"] = f"{_public_base_url.get()}/images/{stored.digest}"
+    supports_links = _protocol_version.get() >= RESOURCE_LINK_PROTOCOL_VERSION
+    if supports_links:
+        content = [{"type": "resource_link", **link}]
+    else:
+        content = [{"type": "text", "text": f"Image stored at: {link['uri']} ({stored.mime_type}, {stored.size} bytes)"}]
+    # The thumbnail is a preview only, skip it rather than fail when the pool is full
+    try:
+        with traced_phase("thumbnail"):
+            thumbnail = await _image_workers.run(make_thumbnail, image_bytes, int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256")))
+        content.append({"type": "image", "data": base64.b64encode(thumbnail).decode('utf-8'), "mimeType": "image/jpeg"})
+    except QueueFullError:
+        logger.warning(f"Image worker queue full, returning {stored.digest} without a thumbnail")
+        # A text link alone would leave an older client with no image at all
+        if not supports_links:
+            content.append(inline_image(image_bytes))
+    return content
+
+
+def inline_image(image_bytes: bytes) -> dict[str, Any]:
+    with traced_phase("base64_encode"):
+        image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+    return {"type": "image", "data": image_b64, "mimeType": "image/png"}
+
+
 async def handle_generate_image(arguments: dict[str, Any]):
     """Handle image generation request"""
     try:
         prompt = arguments.get("prompt", "")
         size = arguments.get("size", os.getenv("DEFAULT_IMAGE_SIZE", "1024x1024"))
+        n = arguments.get("n", 1)
         output_path = arguments.get("output_path")
+        output_paths = arguments.get("output_paths")
         
-        logger.info(f"Image generation request: prompt='{prompt}', size={size}, output_path={output_path}")
+        logger.info(f"Image generation request: prompt='{truncate_prompt(prompt)}', size={size}, n={n}, output_path={output_path}")
         
         # Get Azure configuration
         try:
@@ -242,7 +475,7 @@ async def handle_generate_image(arguments: dict[str, Any]):
         # Validate prompt is in English
         if not is_english_text(prompt):
             error_msg = "Prompt must be in English. Please use English to describe the image you want to generate."
-            logger.warning(f"Non-English prompt rejected: '{prompt}'")
+            logger.warning(f"Non-English prompt rejected: '{truncate_prompt(prompt)}'")
             return {"content": [{"type": "text", "text": error_msg}]}
         
         # Validate image size
@@ -251,68 +484,157 @@ async def handle_generate_image(arguments: dict[str, Any]):
             logger.warning(f"Invalid image size: {size}")
             return {"content": [{"type": "text", "text": error_msg}]}
         
-        async with AzureImageGenerator(
-            base_url=azure_config["base_url"],
-            api_key=azure_config["api_key"],
-            deployment_name=azure_config["deployment_name"],
-            model=azure_config["model"],
-            api_version=azure_config["api_version"]
-        ) as generator:
-            
-            # In HTTP mode, always get image bytes for return to client
-            # If output_path is provided, also save to server
-            result = await generator.generate_image(
-                prompt=prompt,
-                size=size,
-                output_path=output_path
-            )
-            
-            # HTTP mode: always return image data to client
-            if output_path:
-                # Image was saved to file, read it back
-                import aiofiles
-                async with aiofiles.open(output_path, 'rb') as f:
-                    image_bytes = await f.read()
-                image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-                logger.info(f"Image saved to server at: {result} and returning to client (size: {len(image_bytes)} bytes)")
-                return {
-                    "content": [
-                        {"type": "text", "text": f"Image successfully generated. Saved to server at: {result}"},
-                        {"type": "image", "data": image_b64, "mimeType": "image/png"}
-                    ]
-                }
-            else:
-                # result is bytes
-                image_b64 = base64.b64encode(result).decode('utf-8')
-                logger.info(f"Image generation successful, returning base64 data (size: {len(result)} bytes)")
-                return {
-                    "content": [
-                        {"type": "text", "text": f"Image generation successful, prompt: '{prompt}', size: {size}"},
-                        {"type": "image", "data": image_b64, "mimeType": "image/png"}
-                    ]
-                }
-                
+        # Validate image count
+        if not validate_image_count(n):
+            error_msg = f"Unsupported image count: {n}. n must be an integer between 1 and {MAX_IMAGES_PER_REQUEST}"
+            logger.warning(f"Invalid image count: {n}")
+            return {"content": [{"type": "text", "text": error_msg}]}
+
+        # Validate output paths
+        if not validate_output_paths(output_paths):
+            error_msg = "Invalid output_paths: must be a list of non-empty file path strings"
+            logger.warning(f"Invalid output_paths: {output_paths!r}")
+            return {"content": [{"type": "text", "text": error_msg}]}
+        if output_path is not None and not (isinstance(output_path, str) and output_path):
+            error_msg = "Invalid output_path: must be a non-empty file path string"
+            logger.warning(f"Invalid output_path: {output_path!r}")
+            return {"content": [{"type": "text", "text": error_msg}]}
+        
+        paths = expand_output_paths(output_path, output_paths, n)
+        generator = get_generator(azure_config)
+
+        # In HTTP mode, always get image bytes for return to client
+        # If output paths are provided, also save to server
+        images = await generator.generate_images(
+            prompt=prompt,
+            size=size,
+            n=n,
+            output_paths=paths,
+            return_bytes=True
+        )
+
+        # HTTP mode: always return image data to client
+        saved_paths = paths[:len(images)]
+        if saved_paths:
+            logger.info(f"{len(images)} image(s) saved to server at: {', '.join(saved_paths)} and returning to client (size: {sum(len(b) for b in images)} bytes)")
+            content = [{"type": "text", "text": f"Image successfully generated. Saved to server at: {', '.join(saved_paths)}"}]
+        else:
+            logger.info(f"Image generation successful, returning {len(images)} image(s) as base64 data (size: {sum(len(b) for b in images)} bytes)")
+            content = [{"type": "text", "text": f"Image generation successful, prompt: '{prompt}', size: {size}"}]
+        for image_bytes in images:
+            content.extend(await image_content(image_bytes))
+        return {"content": content}
+
+    except (QueueFullError, CircuitOpenError):
+        raise
     except Exception as e:
         error_msg = f"Error generating image: {str(e)}"
         logger.error(f"Image generation failed: {error_msg}")
         return {"content": [{"type": "text", "text": error_msg}]}
 
 
+async def run_generate_batch(items: list[Any], max_concurrency: int, on_item_done=None) -> list[list[dict[str, Any]]]:
+    """Run generate_image for each item under a concurrency cap, isolating failures per item"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    completed = 0
+
+    async def run_item(index: int, item: Any) -> list[dict[str, Any]]:
+        nonlocal completed
+        async with semaphore:
+            if not isinstance(item, dict):
+                content = [{"type": "text", "text": "Error: batch item must be an object"}]
+            else:
+                item_arguments = {"prompt": item.get("prompt", "")}
+                if item.get("size"):
+                    item_arguments["size"] = item["size"]
+                if item.get("output_path"):
+                    item_arguments["output_path"] = item["output_path"]
+                try:
+                    content = (await handle_generate_image(item_arguments))["content"]
+                except (QueueFullError, CircuitOpenError) as e:
+                    content = [{"type": "text", "text": f"Error generating image: {str(e)}"}]
+        completed += 1
+        logger.info(f"Batch item {index} finished ({completed}/{len(items)})")
+        if on_item_done is not None:
+            await on_item_done(index, content, completed)
+        return content
+
+    return await asyncio.gather(*(run_item(i, item) for i, item in enumerate(items)))
+
+
+async def handle_generate_images_batch(arguments: dict[str, Any]):
+    """Handle batch image generation request"""
+    try:
+        items = arguments.get("items")
+        server_limit = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+        max_items = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+        
+        if not isinstance(items, list) or not items:
+            error_msg = "'items' must be a non-empty list of generation requests"
+            logger.error(error_msg)
+            return {"content": [{"type": "text", "text": error_msg}]}
+        
+        if len(items) > max_items:
+            error_msg = f"Too many batch items: {len(items)}. Maximum is {max_items}"
+            logger.warning(error_msg)
+            return {"content": [{"type": "text", "text": error_msg}]}
+        
+        try:
+            max_concurrency = max(1, min(int(arguments.get("max_concurrency", server_limit)), server_limit))
+        except (TypeError, ValueError):
+            error_msg = f"Invalid max_concurrency: {arguments.get('max_concurrency')}"
+            logger.warning(error_msg)
+            return {"content": [{"type": "text", "text": error_msg}]}
+        
+        logger.info(f"Batch generation request: {len(items)} items, max_concurrency={max_concurrency}")
+        
+        # Report each finished item when the call is streamed with a progress token
+        on_item_done = None
+        reporter = _progress_reporter.get()
+        if reporter is not None:
+            reporter.track()
+
+            async def report_item(index: int, item_content: list[dict[str, Any]], completed: int):
+                await reporter.report(completed, len(items), f"Item {index} finished")
+
+            on_item_done = report_item
+
+        results = await run_generate_batch(items, max_concurrency, on_item_done)
+        
+        content = []
+        succeeded = 0
+        for index, item_content in enumerate(results):
+            ok = any(part.get("type") in IMAGE_CONTENT_TYPES for part in item_content)
+            succeeded += ok
+            content.append({"type": "text", "text": f"[item {index}] {'succeeded' if ok else 'failed'}"})
+            content.extend(item_content)
+        
+        summary = f"Batch generation finished: {succeeded}/{len(items)} succeeded"
+        logger.info(summary)
+        return {"content": [{"type": "text", "text": summary}] + content}
+        
+    except Exception as e:
+        error_msg = f"Error in batch generation: {str(e)}"
+        logger.error(f"Batch generation failed: {error_msg}")
+        return {"content": [{"type": "text", "text": error_msg}]}
+
+
 async def handle_edit_image(arguments: dict[str, Any]):
     """Handle image editing request"""
     try:
         image_data_base64 = arguments.get("image_data_base64")
+        upload_id = arguments.get("upload_id")
         prompt = arguments.get("prompt", "") + " (and all other elements exactly the same)"
         size = arguments.get("size")  # Optional size override
         output_path = arguments.get("output_path")
         
-        # Validate input parameters - image_data_base64 is required in HTTP mode
-        if not image_data_base64:
-            error_msg = "'image_data_base64' parameter is required in HTTP mode"
+        # Validate input parameters - image_data_base64 or upload_id is required in HTTP mode
+        if not image_data_base64 and not upload_id:
+            error_msg = "'image_data_base64' or 'upload_id' parameter is required in HTTP mode"
             logger.error(error_msg)
             return {"content": [{"type": "text", "text": error_msg}]}
         
-        logger.info(f"Image editing request: prompt='{prompt}', has_base64=True, output_path={output_path}")
+        logger.info(f"Image editing request: prompt='{truncate_prompt(prompt)}', has_base64={bool(image_data_base64)}, upload_id={upload_id}, output_path={output_path}")
         
         # Get Azure configuration
         try:
@@ -325,16 +647,21 @@ async def handle_edit_image(arguments: dict[str, Any]):
         # Validate prompt is in English
         if not is_english_text(prompt):
             error_msg = "Prompt must be in English. Please use English to describe how you want to edit the image."
-            logger.warning(f"Non-English prompt rejected: '{prompt}'")
+            logger.warning(f"Non-English prompt rejected: '{truncate_prompt(prompt)}'")
             return {"content": [{"type": "text", "text": error_msg}]}
         
-        # Prepare image data for processing
-        import tempfile
-        temp_input_path = None
-        
+        # Load the uploaded or base64 image in memory, it is sent to Azure without touching disk
         try:
-            # Decode base64 data and save to temporary file
-            try:
+            if upload_id:
+                # Uploads are kept until they expire, so one image can be edited several times
+                with traced_phase("upload_read"):
+                    image_bytes = await _upload_store.read(str(upload_id))
+                if image_bytes is None:
+                    error_msg = f"Unknown or expired upload_id: {upload_id}"
+                    logger.error(error_msg)
+                    return {"content": [{"type": "text", "text": error_msg}]}
+                logger.info(f"Loaded uploaded image data (size: {len(image_bytes)} bytes)")
+            else:
                 # Handle Data URL format (e.g., "data:image/png;base64,...")
                 base64_data = image_data_base64.strip()
                 if base64_data.startswith('data:'):
@@ -348,98 +675,363 @@ async def handle_edit_image(arguments: dict[str, Any]):
                         return {"content": [{"type": "text", "text": error_msg}]}
                 
                 # Decode base64 string to bytes
-                image_bytes = base64.b64decode(base64_data)
+                with traced_phase("base64_decode"):
+                    image_bytes = base64.b64decode(base64_data)
                 logger.info(f"Decoded base64 image data (size: {len(image_bytes)} bytes)")
-                
-                # Validate image data by trying to open it with PIL
-                import io
-                from PIL import Image
-                try:
-                    with Image.open(io.BytesIO(image_bytes)) as img:
-                        img_format = img.format.lower() if img.format else 'png'
-                        # Verify the image by loading it fully
-                        img.verify()
-                        logger.info(f"Validated image format: {img_format}, size: {img.size}")
-                        
-                        # Re-open for saving (verify() closes the file)
-                        img_for_save = Image.open(io.BytesIO(image_bytes))
-                        
-                        # Create temporary file with correct extension
-                        with tempfile.NamedTemporaryFile(mode='wb', suffix=f'.{img_format}', delete=False) as temp_file:
-                            temp_input_path = temp_file.name
-                            # Save using PIL to ensure valid format
-                            img_for_save.save(temp_file, format=img_format.upper())
-                        logger.info(f"Saved validated image to: {temp_input_path}")
-                        image_path_to_use = temp_input_path
-                except Exception as img_error:
-                    error_msg = f"Invalid image data: {str(img_error)}"
-                    logger.error(f"Image validation failed: {error_msg}")
-                    return {"content": [{"type": "text", "text": error_msg}]}
-            except Exception as e:
-                error_msg = f"Failed to decode base64 image data: {str(e)}"
-                logger.error(error_msg)
-                return {"content": [{"type": "text", "text": error_msg}]}
             
-            async with AzureImageGenerator(
-                base_url=azure_config["base_url"],
-                api_key=azure_config["api_key"],
-                deployment_name=azure_config["deployment_name"],
-                model=azure_config["model"],
-                api_version=azure_config["api_version"]
-            ) as generator:
-                
-                # Edit the image
-                result = await generator.edit_image(
-                    image_path=image_path_to_use,
-                    prompt=prompt,
-                    size=size,
-                    output_path=output_path
-                )
-                
-                # HTTP mode: always return image data to client
-                if output_path:
-                    # Image was saved to file, read it back
-                    import aiofiles
-                    async with aiofiles.open(output_path, 'rb') as f:
-                        image_bytes = await f.read()
-                    image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-                    logger.info(f"Edited image saved to server at: {result} and returning to client (size: {len(image_bytes)} bytes)")
-                    return {
-                        "content": [
-                            {"type": "text", "text": f"Image successfully edited. Saved to server at: {result}"},
-                            {"type": "image", "data": image_b64, "mimeType": "image/png"}
-                        ]
-                    }
-                else:
-                    # result is bytes
-                    image_b64 = base64.b64encode(result).decode('utf-8')
-                    logger.info(f"Image editing successful, returning base64 data (size: {len(result)} bytes)")
-                    return {
-                        "content": [
-                            {"type": "text", "text": f"Image editing successful, edit prompt: '{prompt}'"},
-                            {"type": "image", "data": image_b64, "mimeType": "image/png"}
-                        ]
-                    }
-        finally:
-            # Clean up temporary file if created
-            if temp_input_path and os.path.exists(temp_input_path):
+            # Validate format and dimensions from the image header; the full
+            # PIL decode on the worker pool only runs with IMAGE_VALIDATION=full
+            # or for formats other than PNG, JPEG and WebP
+            try:
                 try:
-                    os.unlink(temp_input_path)
-                    logger.info(f"Cleaned up temporary file: {temp_input_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to clean up temporary file {temp_input_path}: {e}")
+                    with traced_phase("header_sniff"):
+                        header = sniff_image(image_bytes)
+                    verified = False
+                except ValueError:
+                    with traced_phase("pil_validate"):
+                        header = await inspect_image_header(_image_workers, image_bytes)
+                    verified = True
+                check_image_limits(header, int(os.getenv("MAX_IMAGE_PIXELS", "16777216")))
+                if not verified and os.getenv("IMAGE_VALIDATION", "header").strip().lower() == "full":
+                    with traced_phase("pil_validate"):
+                        await _image_workers.run(inspect_image, image_bytes)
+                logger.info(f"Validated image format: {header.format}, size: ({header.width}, {header.height})")
+            except QueueFullError:
+                raise
+            except Exception as img_error:
+                error_msg = f"Invalid image data: {str(img_error)}"
+                logger.error(f"Image validation failed: {error_msg}")
+                return {"content": [{"type": "text", "text": error_msg}]}
+        except QueueFullError:
+            raise
+        except Exception as e:
+            error_msg = f"Failed to load image data: {str(e)}"
+            logger.error(error_msg)
+            return {"content": [{"type": "text", "text": error_msg}]}
+        
+        generator = get_generator(azure_config)
+
+        # Edit the image, defaulting to the dimensions found during validation
+        result_bytes = await generator.edit_image(
+            image_data=image_bytes,
+            prompt=prompt,
+            size=size or f"{header.width}x{header.height}",
+            output_path=output_path,
+            return_bytes=True
+        )
+
+        # HTTP mode: always return image data to client
+        if output_path:
+            logger.info(f"Edited image saved to server at: {output_path} and returning to client (size: {len(result_bytes)} bytes)")
+            return {
+                "content": [
+                    {"type": "text", "text": f"Image successfully edited. Saved to server at: {output_path}"},
+                    *await image_content(result_bytes)
+                ]
+            }
+        else:
+            logger.info(f"Image editing successful, returning image data (size: {len(result_bytes)} bytes)")
+            return {
+                "content": [
+                    {"type": "text", "text": f"Image editing successful, edit prompt: '{prompt}'"},
+                    *await image_content(result_bytes)
+                ]
+            }
                 
+    except (QueueFullError, CircuitOpenError):
+        raise
     except Exception as e:
         error_msg = f"Error editing image: {str(e)}"
         logger.error(f"Image editing failed: {error_msg}")
         return {"content": [{"type": "text", "text": error_msg}]}
 
 
+SUPPORTED_PROTOCOL_VERSIONS = ("2024-11-05", "2025-03-26", "2025-06-18")
+
+# First protocol version with resource_link tool result content
+RESOURCE_LINK_PROTOCOL_VERSION = "2025-06-18"
+
+
+class JsonRpcError(Exception):
+    """Raised by method handlers to answer with a specific JSON-RPC error code"""
+    code = -32603
+
+
+class MethodNotFoundError(JsonRpcError):
+    """Raised for JSON-RPC methods this server does not implement"""
+    code = -32601
+
+
+class InvalidParamsError(JsonRpcError):
+    code = -32602
+
+
+class ResourceNotFoundError(JsonRpcError):
+    # Code the MCP specification assigns to unknown resources
+    code = -32002
+
+
+RESOURCES_PAGE_SIZE = 100
+
+RESOURCE_TEMPLATES = [
+    {
+        "uriTemplate": "image://{digest}",
+        "name": "Generated image",
+        "description": "An image generated or edited by this server, addressed by the SHA-256 digest of its bytes"
+    }
+]
+
+
+def resource_entry(stored: StoredImage) -> dict[str, Any]:
+    return {"uri": stored.uri, "name": stored.filename, "mimeType": stored.mime_type, "size": stored.size}
+
+
+def list_resources(cursor: Any) -> dict[str, Any]:
+    """One page of stored images, oldest first
+
+    The cursor is the store time and digest of the last entry returned, so
+    entries stored within the same clock tick are neither skipped nor repeated.
+    """
+    entries = sorted(_image_store.entries(), key=lambda entry: (entry.created_at, entry.digest))
+    if cursor is not None:
+        created_at, _, digest = str(cursor).rpartition(":")
+        try:
+            after = (float(created_at), digest)
+        except ValueError:
+            raise InvalidParamsError(f"Invalid cursor: {cursor}")
+        if not DIGEST_PATTERN.match(digest):
+            raise InvalidParamsError(f"Invalid cursor: {cursor}")
+        entries = [entry for entry in entries if (entry.created_at, entry.digest) > after]
+    page = entries[:RESOURCES_PAGE_SIZE]
+    result: dict[str, Any] = {"resources": [resource_entry(entry) for entry in page]}
+    if len(entries) > len(page):
+        result["nextCursor"] = f"{page[-1].created_at!r}:{page[-1].digest}"
+    return result
+
+
+async def read_resource(uri: Any) -> dict[str, Any]:
+    """Contents of an image://{digest} resource as base64"""
+    digest = parse_resource_uri(uri)
+    if digest is None:
+        raise InvalidParamsError(f"Invalid resource URI: {uri}")
+    stored = _image_store.get(digest)
+    data = await _image_store.read(digest) if stored is not None else None
+    if data is None:
+        raise ResourceNotFoundError(f"Resource not found: {uri}")
+    with traced_phase("base64_encode"):
+        blob = base64.b64encode(data).decode('utf-8')
+    return {"contents": [{"uri": stored.uri, "mimeType": stored.mime_type, "blob": blob}]}
+
+
+async def dispatch_method(method: str, params: dict[str, Any]) -> dict[str, Any]:
+    """Run a JSON-RPC request method and return its result"""
+    with start_span(method, {"rpc.system": "jsonrpc", "rpc.method": method}):
+        return await _dispatch_method(method, params)
+
+
+async def _dispatch_method(method: str, params: dict[str, Any]) -> dict[str, Any]:
+    if method == "initialize":
+        requested = params.get("protocolVersion")
+        capabilities: dict[str, Any] = {"tools": {}}
+        if _image_store is not None:
+            capabilities["resources"] = {}
+        return {
+            "protocolVersion": requested if requested in SUPPORTED_PROTOCOL_VERSIONS else SUPPORTED_PROTOCOL_VERSIONS[0],
+            "capabilities": capabilities,
+            "serverInfo": {
+                "name": "azure-image-editor",
+                "version": "1.0.0"
+            }
+        }
+    elif method == "tools/list":
+        return await get_tools_list()
+    elif method == "tools/call":
+        tool_name = params.get("name")
+        arguments = params.get("arguments", {})
+        return await call_tool(tool_name, arguments)
+    elif method == "resources/list" and _image_store is not None:
+        return list_resources(params.get("cursor"))
+    elif method == "resources/templates/list" and _image_store is not None:
+        return {"resourceTemplates": RESOURCE_TEMPLATES}
+    elif method == "resources/read" and _image_store is not None:
+        return await read_resource(params.get("uri"))
+    raise MethodNotFoundError(f"Method not found: {method}")
+
+
+def is_notification(message: Any) -> bool:
+    return isinstance(message, dict) and isinstance(message.get("method"), str) and message.get("id") is None
+
+
+def jsonrpc_error(request_id: Any, code: int, message: str) -> dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+async def respond(message: Any) -> dict[str, Any] | None:
+    """Run one JSON-RPC message and return its response, or None for notifications"""
+    if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+        return jsonrpc_error(message.get("id") if isinstance(message, dict) else None, -32600, "Invalid Request")
+
+    method = message["method"]
+    request_id = message.get("id")
+    if is_notification(message):
+        logger.info(f"Notification received: {method}")
+        return None
+
+    try:
+        result = await dispatch_method(method, message.get("params") or {})
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+    except JsonRpcError as e:
+        return jsonrpc_error(request_id, e.code, str(e))
+    except QueueFullError as e:
+        logger.warning(f"Rejected request, queue full: {e}")
+        return jsonrpc_error(request_id, -32001, str(e))
+    except CircuitOpenError as e:
+        logger.warning(f"Rejected request, circuit open: {e}")
+        return jsonrpc_error(request_id, -32003, str(e))
+    except Exception as e:
+        logger.error(f"Error handling request: {e}")
+        return jsonrpc_error(request_id, -32603, str(e))
+
+
+# Progress reporter for the request being streamed, if any
+_progress_reporter: ContextVar["ProgressReporter | None"] = ContextVar("progress_reporter", default=None)
+
+KEEPALIVE = object()
+
+
+class ProgressReporter:
+    """Queues notifications/progress messages for one request on an SSE stream"""
+
+    def __init__(self, progress_token: Any, queue: asyncio.Queue):
+        self.progress_token = progress_token
+        self.queue = queue
+        self.tracking = False
+
+    def track(self):
+        """Switch from elapsed-time heartbeats to progress reported by the tool"""
+        self.tracking = True
+
+    async def report(self, progress: float, total: float | None = None, message: str | None = None):
+        if self.progress_token is None:
+            return
+        params = {"progressToken": self.progress_token, "progress": progress}
+        if total is not None:
+            params["total"] = total
+        if message:
+            params["message"] = message
+        await self.queue.put({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+
+    async def heartbeat(self, elapsed: float):
+        """Keep the stream alive, as a progress notification when the client gave a token"""
+        if self.progress_token is None or self.tracking:
+            await self.queue.put(KEEPALIVE)
+        else:
+            await self.report(round(elapsed, 1), message=f"Waiting for Azure ({elapsed:.0f}s elapsed)")
+
+
+def format_sse(item: Any) -> str:
+    if item is KEEPALIVE:
+        return ": keepalive\n\n"
+    return f"event: message\ndata: {json.dumps(item)}\n\n"
+
+
+def stream_responses(messages: list[Any]) -> Response:
+    """Run JSON-RPC requests concurrently, streaming progress and each response as SSE events
+
+    The server span of the HTTP request is ended once the stream closes,
+    so the calls are traced as its children while they run.
+    """
+    requests = [m for m in messages if not is_notification(m)]
+    if not requests:
+        return Response(status_code=202)
+
+    server_span = current_span()
+    queue: asyncio.Queue = asyncio.Queue()
+    heartbeat_seconds = float(os.getenv("SSE_HEARTBEAT_SECONDS", "10"))
+    tasks: list[asyncio.Task] = []
+
+    async def run(message: Any):
+        params = message.get("params") if isinstance(message, dict) else None
+        meta = params.get("_meta") if isinstance(params, dict) else None
+        reporter = ProgressReporter(meta.get("progressToken") if isinstance(meta, dict) else None, queue)
+        _progress_reporter.set(reporter)
+        started = time.monotonic()
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(heartbeat_seconds)
+                await reporter.heartbeat(time.monotonic() - started)
+
+        heartbeat_task = asyncio.create_task(heartbeat())
+        try:
+            response = await respond(message)
+        finally:
+            heartbeat_task.cancel()
+        await queue.put(response)
+
+    async def events():
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if isinstance(item, dict) and "method" not in item:
+                    remaining -= 1
+                yield format_sse(item)
+        finally:
+            # Client went away or all responses sent
+            for task in tasks:
+                task.cancel()
+            end_span(server_span)
+
+    # Start now so the calls inherit the request's trace context
+    tasks.extend(asyncio.create_task(run(message)) for message in requests)
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def wants_event_stream(request: Request) -> bool:
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
 # HTTP Handlers
 async def handle_jsonrpc(request: Request):
-    """Handle JSON-RPC 2.0 requests"""
+    """Handle JSON-RPC 2.0 requests, continuing the caller's trace if it sent one"""
+    with sampled_request_logs(), start_span("POST /", {"http.request.method": "POST"}, kind="server", carrier=request.headers, end_on_exit=False) as span:
+        _public_base_url.set(os.getenv("PUBLIC_BASE_URL", "").strip().rstrip("/") or str(request.base_url).rstrip("/"))
+        protocol_version = request.headers.get("mcp-protocol-version", "").strip()
+        if protocol_version in SUPPORTED_PROTOCOL_VERSIONS:
+            _protocol_version.set(protocol_version)
+        try:
+            response = await process_jsonrpc(request)
+        except BaseException:
+            end_span(span)
+            raise
+        set_span_attributes(span, {"http.response.status_code": response.status_code})
+        # stream_responses ends the span when the event stream closes
+        if not isinstance(response, StreamingResponse):
+            end_span(span)
+        return response
+
+
+async def process_jsonrpc(request: Request):
+    """Parse a JSON-RPC 2.0 request and build the HTTP response"""
     try:
         body = await request.json()
+
+        # Batches and streamed tool calls (MCP Streamable HTTP transport)
+        if isinstance(body, list):
+            logger.info(f"Received JSON-RPC batch of {len(body)} messages")
+            if wants_event_stream(request):
+                return stream_responses(body)
+            responses = [r for r in await asyncio.gather(*(respond(m) for m in body)) if r is not None]
+            return JSONResponse(responses) if responses else Response(status_code=202)
+        if wants_event_stream(request) and body.get("method") == "tools/call" and body.get("id") is not None:
+            logger.info(f"Received JSON-RPC request: {body.get('method')} (streamed)")
+            return stream_responses([body])
+
         logger.info(f"Received JSON-RPC request: {body.get('method')}")
         
         # Extract request details
@@ -462,30 +1054,15 @@ async def handle_jsonrpc(request: Request):
                 return Response(status_code=204)  # No Content
         
         # Handle different methods (requests that need responses)
-        if method == "initialize":
-            result = {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {
-                    "tools": {}
-                },
-                "serverInfo": {
-                    "name": "azure-image-editor",
-                    "version": "1.0.0"
-                }
-            }
-        elif method == "tools/list":
-            result = await get_tools_list()
-        elif method == "tools/call":
-            tool_name = params.get("name")
-            arguments = params.get("arguments", {})
-            result = await call_tool(tool_name, arguments)
-        else:
+        try:
+            result = await dispatch_method(method, params)
+        except JsonRpcError as e:
             return JSONResponse({
                 "jsonrpc": "2.0",
                 "id": request_id,
                 "error": {
-                    "code": -32601,
-                    "message": f"Method not found: {method}"
+                    "code": e.code,
+                    "message": str(e)
                 }
             }, status_code=400)
         
@@ -495,6 +1072,26 @@ async def handle_jsonrpc(request: Request):
             "result": result
         })
         
+    except QueueFullError as e:
+        logger.warning(f"Rejected request, queue full: {e}")
+        return JSONResponse({
+            "jsonrpc": "2.0",
+            "id": body.get("id"),
+            "error": {
+                "code": -32001,
+                "message": str(e)
+            }
+        }, status_code=503)
+    except CircuitOpenError as e:
+        logger.warning(f"Rejected request, circuit open: {e}")
+        return JSONResponse({
+            "jsonrpc": "2.0",
+            "id": body.get("id"),
+            "error": {
+                "code": -32003,
+                "message": str(e)
+            }
+        }, status_code=503)
     except json.JSONDecodeError as e:
         logger.error(f"Invalid JSON: {e}")
         return JSONResponse({
@@ -521,14 +1118,120 @@ async def handle_health(request: Request):
     return Response("OK", status_code=200)
 
 
+async def handle_image(request: Request):
+    """Serve a stored result image by digest; the content never changes, so it is cacheable forever"""
+    digest = request.path_params["digest"]
+    stored = _image_store.get(digest) if _image_store is not None else None
+    if stored is None:
+        return JSONResponse({"error": "Image not found"}, status_code=404)
+
+    try:
+        stat_result = await asyncio.to_thread(os.stat, stored.path)
+    except FileNotFoundError:
+        _image_store.forget(digest)
+        return JSONResponse({"error": "Image not found"}, status_code=404)
+
+    etag = f'"{stored.digest}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    # FileResponse handles Range/If-Range and uses the server's zero-copy send when available
+    return FileResponse(stored.path, media_type=stored.mime_type, headers=headers, stat_result=stat_result)
+
+
+async def handle_upload(request: Request):
+    """Stream a raw image body into the upload store and return its upload id"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > _upload_store.max_bytes:
+        _upload_store.rejected += 1
+        return JSONResponse({"error": f"Upload exceeds {_upload_store.max_bytes} bytes"}, status_code=413)
+    content_type = request.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
+    if content_type.startswith("multipart/"):
+        return JSONResponse({"error": "Send the image bytes as the raw request body, not multipart/form-data"}, status_code=415)
+
+    try:
+        upload = await _upload_store.receive(request.stream(), content_type)
+    except UploadTooLargeError as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except UploadStoreFullError as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "1"})
+    if upload.size == 0:
+        _upload_store.discard(upload.id)
+        return JSONResponse({"error": "Empty upload"}, status_code=400)
+
+    logger.info(f"Received upload {upload.id} ({upload.size} bytes, {content_type})")
+    return JSONResponse(upload.summary(_upload_store.ttl_seconds), status_code=201)
+
+
+async def handle_delete_upload(request: Request):
+    """Release an upload before it expires"""
+    upload_id = request.path_params["upload_id"]
+    if _upload_store.get(upload_id) is None:
+        return JSONResponse({"error": "Upload not found"}, status_code=404)
+    _upload_store.discard(upload_id)
+    return Response(status_code=204)
+
+
+async def handle_status(request: Request):
+    """Runtime status endpoint"""
+    cache = _generator.cache if _generator is not None else None
+    single_flight = _generator.single_flight if _generator is not None else None
+    return JSONResponse({
+        "cache": cache.stats() if cache is not None else None,
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "admission": _generator.limiter.stats() if _generator is not None and _generator.limiter is not None else None,
+        "retry": {
+            "retries": _generator.retries,
+            "budget": _generator.retry_budget.stats() if _generator.retry_budget is not None else None
+        } if _generator is not None else None,
+        "endpoints": _generator.balancer.stats() if _generator is not None else None,
+        "jobs": _job_store.stats(),
+        "image_workers": _image_workers.stats(),
+        "image_store": _image_store.stats() if _image_store is not None else None,
+        "uploads": _upload_store.stats()
+    })
+
+
+async def handle_metrics(request: Request):
+    """Prometheus metrics endpoint"""
+    if _generator is not None and _generator.limiter is not None:
+        ADMISSION_QUEUE_DEPTH.set(_generator.limiter.queue_depth)
+    IMAGE_WORKERS_ACTIVE.set(_image_workers.limiter.active)
+    IMAGE_WORKERS_QUEUE_DEPTH.set(_image_workers.limiter.queue_depth)
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Create the shared generator at startup and close it at shutdown"""
+    try:
+        get_generator(get_azure_config())
+    except (ValueError, Exception) as e:
+        logger.warning(f"Shared generator not created at startup: {str(e)}")
+    try:
+        yield
+    finally:
+        await _job_store.aclose()
+        await close_generator()
+        _image_workers.shutdown()
+        _upload_store.close()
+        shutdown_tracing()
+
+
 def create_app():
     """Create Starlette application"""
     routes = [
         Route("/", endpoint=handle_jsonrpc, methods=["POST"]),
         Route("/health", endpoint=handle_health, methods=["GET"]),
+        Route("/status", endpoint=handle_status, methods=["GET"]),
+        Route("/metrics", endpoint=handle_metrics, methods=["GET"]),
+        Route("/images/{digest}", endpoint=handle_image, methods=["GET"]),
+        Route("/uploads", endpoint=handle_upload, methods=["POST"]),
+        Route("/uploads/{upload_id}", endpoint=handle_delete_upload, methods=["DELETE"]),
     ]
     
-    return Starlette(debug=True, routes=routes)
+    return Starlette(debug=True, routes=routes, lifespan=lifespan)
 
 
 async def main():
@@ -542,6 +1245,8 @@ async def main():
         logger.info(f"   - Deployment name: {azure_config['deployment_name']}")
         logger.info(f"   - Model: {azure_config['model']}")
         logger.info(f"   - API key: {'*' * (len(azure_config['api_key']) - 4) + azure_config['api_key'][-4:]}")
+        if len(azure_config["endpoints"]) > 1:
+            logger.info(f"   - Load balancing across {len(azure_config['endpoints'])} deployments")
     except (ValueError, Exception) as e:
         logger.error(f"❌ Azure configuration verification failed: {str(e)}")
         logger.error("Please set the following required environment variables:")
@@ -554,6 +1259,8 @@ async def main():
         print("\n💡 Tip: Set these environment variables in a .env file", file=sys.stderr)
         sys.exit(1)
     
+    setup_tracing("azure-image-editor-http")
+    
     # Get server configuration
     host = os.getenv("MCP_SERVER_HOST", "127.0.0.1")
     port = int(os.getenv("MCP_SERVER_PORT", "8000"))
@@ -563,6 +1270,8 @@ async def main():
     logger.info(f"🌐 Server listening on http://{host}:{port}")
     logger.info(f"🔌 JSON-RPC endpoint: http://{host}:{port}/")
     logger.info(f"❤️  Health check: http://{host}:{port}/health")
+    logger.info(f"📈 Status: http://{host}:{port}/status")
+    logger.info(f"📉 Metrics: http://{host}:{port}/metrics")
     
     app = create_app()
     
@@ -572,6 +1281,8 @@ async def main():
         port=port,
         log_level="info",
         access_log=True,
+        # Keep uvicorn's records on the root queue handler instead of its own stream handlers
+        log_config=None,
     )
     server_instance = uvicorn.Server(config)
     await server_instance.serve()
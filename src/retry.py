@@ -0,0 +1,140 @@
+"""
+Retry policies for upstream Azure calls
+
+Transient failures (429, 5xx, connection resets) are retried with
+decorrelated-jitter exponential backoff, honoring Retry-After and
+retry-after-ms. A retry budget shared by all requests caps retries to a
+fraction of normal traffic so retries cannot amplify an outage.
+"""
+
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+import httpx
+
+
+# Errors that mean the request never reached Azure or the connection was reset
+RETRYABLE_TRANSPORT_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.ReadError,
+    httpx.WriteError,
+    httpx.RemoteProtocolError,
+)
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Return the server-requested delay in seconds, if any"""
+    for header in ("retry-after-ms", "x-ms-retry-after-ms"):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return max(0.0, float(value) / 1000.0)
+            except ValueError:
+                pass
+
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Token bucket shared across requests: each request earns a fraction of a retry"""
+
+    def __init__(self, ratio: float = 0.2, min_retries_per_second: float = 1.0, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self.exhausted = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_retries_per_second)
+        self._updated = now
+
+    def record_request(self):
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        self.exhausted += 1
+        return False
+
+    def stats(self) -> dict[str, Any]:
+        self._refill()
+        return {"tokens": round(self._tokens, 2), "exhausted": self.exhausted}
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        retry_statuses: tuple[int, ...] = (429, 500, 502, 503, 504),
+        retry_connection_errors: bool = True
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = set(retry_statuses)
+        self.retry_connection_errors = retry_connection_errors
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in self.retry_statuses
+        return self.retry_connection_errors and isinstance(error, RETRYABLE_TRANSPORT_ERRORS)
+
+    def next_delay(self, previous_delay: float) -> float:
+        """Decorrelated jitter: sleep = min(cap, random(base, previous * 3))"""
+        upper = max(self.base_delay, previous_delay * 3)
+        return min(self.max_delay, random.uniform(self.base_delay, upper))
+
+    def delay_for(self, error: Exception, previous_delay: float) -> Optional[float]:
+        """Delay before the next attempt, or None if the server asks for longer than max_delay"""
+        delay = self.next_delay(previous_delay)
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = parse_retry_after(error.response)
+            if retry_after is not None:
+                if retry_after > self.max_delay:
+                    return None
+                delay = max(delay, retry_after)
+        return delay
+
+
+def retry_policy_from_env(operation: str) -> RetryPolicy:
+    """Build the retry policy for an operation, e.g. AZURE_EDIT_RETRY_MAX_ATTEMPTS overrides AZURE_RETRY_MAX_ATTEMPTS"""
+    def setting(name: str, default: str) -> str:
+        return os.getenv(f"AZURE_{operation.upper()}_RETRY_{name}") or os.getenv(f"AZURE_RETRY_{name}", default)
+
+    return RetryPolicy(
+        max_attempts=int(setting("MAX_ATTEMPTS", "3")),
+        base_delay=float(setting("BASE_DELAY", "1")),
+        max_delay=float(setting("MAX_DELAY", "30"))
+    )
+
+
+def retry_budget_from_env() -> RetryBudget:
+    """Build the shared retry budget from environment variables"""
+    return RetryBudget(
+        ratio=float(os.getenv("AZURE_RETRY_BUDGET_RATIO", "0.2")),
+        min_retries_per_second=float(os.getenv("AZURE_RETRY_BUDGET_MIN_PER_SECOND", "1"))
+    )
@@ -0,0 +1,44 @@
+"""
+Single-flight coalescing of identical in-flight requests
+
+Concurrent callers asking for the same key share one underlying call and
+all receive its result (or its exception).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for key, or join the call already running for key"""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.followers += 1
+        # Shield so one caller giving up does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, int]:
+        """Return coalescing counters"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
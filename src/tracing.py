@@ -0,0 +1,132 @@
+"""
+Optional OpenTelemetry tracing
+
+Spans are created through the OpenTelemetry API when it is installed and
+are no-ops otherwise. They are exported by whatever TracerProvider the
+process installs: setup_tracing() adds an OTLP exporter when
+OTEL_TRACING_ENABLED is set, and tests can install an SDK provider with an
+in-memory exporter instead.
+"""
+
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator, Mapping, Optional
+
+from metrics import PHASE_SECONDS
+
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import SpanKind
+except ImportError:
+    propagate = None
+    trace = None
+    SpanKind = None
+
+logger = logging.getLogger(__name__)
+
+TRACER_NAME = "azure-image-editor"
+
+
+def tracing_available() -> bool:
+    return trace is not None
+
+
+@contextmanager
+def start_span(
+    name: str,
+    attributes: Optional[Mapping[str, Any]] = None,
+    kind: str = "internal",
+    carrier: Optional[Mapping[str, str]] = None,
+    end_on_exit: bool = True
+) -> Iterator[Any]:
+    """Start a span as the current span, or do nothing if OpenTelemetry is not installed
+
+    kind is "internal", "server" or "client". carrier holds incoming headers
+    to continue a trace started by the caller. With end_on_exit=False the
+    span outlives the block and must be finished with end_span().
+    """
+    if trace is None:
+        yield None
+        return
+    context = propagate.extract(carrier) if carrier is not None else None
+    tracer = trace.get_tracer(TRACER_NAME)
+    with tracer.start_as_current_span(
+        name,
+        context=context,
+        kind=getattr(SpanKind, kind.upper()),
+        attributes={k: v for k, v in (attributes or {}).items() if v is not None},
+        end_on_exit=end_on_exit
+    ) as span:
+        yield span
+
+
+def end_span(span: Any):
+    """End a span started with end_on_exit=False"""
+    if span is not None:
+        span.end()
+
+
+def current_span() -> Any:
+    """Return the active span, or None if OpenTelemetry is not installed"""
+    return trace.get_current_span() if trace is not None else None
+
+
+def set_span_attributes(span: Any, attributes: Mapping[str, Any]):
+    """Set attributes on a span, skipping None values"""
+    if span is None or not span.is_recording():
+        return
+    span.set_attributes({k: v for k, v in attributes.items() if v is not None})
+
+
+@contextmanager
+def traced_phase(phase: str) -> Iterator[Any]:
+    """Trace a request phase as a span and record it in the phase latency histogram"""
+    with start_span(phase) as span, PHASE_SECONDS.time(phase=phase):
+        yield span
+
+
+def inject_trace_headers(headers: dict[str, str]) -> str:
+    """Add trace context and a fresh x-ms-client-request-id to outgoing headers
+
+    Returns the client request id, which Azure logs and echoes back so a
+    specific upstream request can be found when escalating to support.
+    """
+    client_request_id = str(uuid.uuid4())
+    headers["x-ms-client-request-id"] = client_request_id
+    headers["x-ms-return-client-request-id"] = "true"
+    if propagate is not None:
+        propagate.inject(headers)
+    return client_request_id
+
+
+def setup_tracing(service_name: str) -> bool:
+    """Install an OTLP-exporting TracerProvider if OTEL_TRACING_ENABLED is set"""
+    if os.getenv("OTEL_TRACING_ENABLED", "false").strip().lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        logger.warning(f"Tracing enabled but OpenTelemetry is not installed: {e}")
+        logger.warning("Install it with: pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", service_name)}))
+    # The exporter reads OTEL_EXPORTER_OTLP_ENDPOINT and related variables
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    logger.info("OpenTelemetry tracing enabled")
+    return True
+
+
+def shutdown_tracing():
+    """Flush buffered spans before the process exits"""
+    if trace is None:
+        return
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
@@ -0,0 +1,145 @@
+"""
+Spooled image uploads for edit_image
+
+Clients POST image bytes to /uploads instead of embedding base64 in the
+JSON-RPC body. Each upload is streamed into a SpooledTemporaryFile, kept
+in memory up to spool_max_memory bytes and moved to an anonymous temp
+file beyond that, and is referenced by its upload id until it expires.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, BinaryIO, Optional
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the size limit"""
+
+
+class UploadStoreFullError(Exception):
+    """Raised when no more uploads can be accepted"""
+
+
+class Upload:
+    def __init__(self, file: BinaryIO, size: int, content_type: str):
+        self.id = uuid.uuid4().hex
+        self.file = file
+        self.size = size
+        self.content_type = content_type
+        self.created_at = time.time()
+        # Serializes reads, which seek the shared file
+        self.lock = asyncio.Lock()
+
+    def summary(self, ttl_seconds: float) -> dict[str, Any]:
+        return {
+            "upload_id": self.id,
+            "size": self.size,
+            "content_type": self.content_type,
+            "expires_at": self.created_at + ttl_seconds,
+        }
+
+
+def _read_all(file: BinaryIO) -> bytes:
+    file.seek(0)
+    return file.read()
+
+
+class UploadStore:
+    def __init__(
+        self,
+        max_uploads: int = 100,
+        max_bytes: int = 50 * 1024 * 1024,
+        spool_max_memory: int = 1024 * 1024,
+        ttl_seconds: float = 900.0
+    ):
+        self.max_uploads = max_uploads
+        self.max_bytes = max_bytes
+        self.spool_max_memory = spool_max_memory
+        self.ttl_seconds = ttl_seconds
+        self._uploads: "OrderedDict[str, Upload]" = OrderedDict()
+        self.total_bytes = 0
+        self.rejected = 0
+
+    def _purge(self):
+        """Drop uploads whose TTL has passed"""
+        now = time.time()
+        while self._uploads:
+            upload = next(iter(self._uploads.values()))
+            if now - upload.created_at < self.ttl_seconds:
+                break
+            self.discard(upload.id)
+
+    async def receive(self, chunks: AsyncIterator[bytes], content_type: str = "application/octet-stream") -> Upload:
+        """Stream chunks into a spooled buffer and register them as an upload"""
+        self._purge()
+        if len(self._uploads) >= self.max_uploads:
+            self.rejected += 1
+            raise UploadStoreFullError(f"Upload store full: {len(self._uploads)} uploads pending")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_max_memory)
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    self.rejected += 1
+                    raise UploadTooLargeError(f"Upload exceeds {self.max_bytes} bytes")
+                if size > self.spool_max_memory:
+                    # The spool has moved to disk
+                    await asyncio.to_thread(spool.write, chunk)
+                else:
+                    spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+
+        upload = Upload(spool, size, content_type)
+        self._uploads[upload.id] = upload
+        self.total_bytes += size
+        return upload
+
+    def get(self, upload_id: str) -> Optional[Upload]:
+        self._purge()
+        return self._uploads.get(upload_id)
+
+    async def read(self, upload_id: str) -> Optional[bytes]:
+        """Return the bytes of an upload, None if it is unknown or expired"""
+        upload = self.get(upload_id)
+        if upload is None:
+            return None
+        async with upload.lock:
+            return await asyncio.to_thread(_read_all, upload.file)
+
+    def discard(self, upload_id: str):
+        upload = self._uploads.pop(upload_id, None)
+        if upload is not None:
+            self.total_bytes -= upload.size
+            upload.file.close()
+
+    def close(self):
+        """Release all buffered uploads"""
+        for upload_id in list(self._uploads):
+            self.discard(upload_id)
+
+    def stats(self) -> dict[str, Any]:
+        self._purge()
+        return {
+            "uploads": len(self._uploads),
+            "max_uploads": self.max_uploads,
+            "bytes": self.total_bytes,
+            "rejected": self.rejected,
+        }
+
+
+def upload_store_from_env() -> UploadStore:
+    """Create an UploadStore from environment variables"""
+    return UploadStore(
+        max_uploads=int(os.getenv("UPLOAD_MAX_PENDING", "100")),
+        max_bytes=int(os.getenv("UPLOAD_MAX_MB", "50")) * 1024 * 1024,
+        spool_max_memory=int(os.getenv("UPLOAD_SPOOL_MEMORY_KB", "1024")) * 1024,
+        ttl_seconds=float(os.getenv("UPLOAD_TTL_SECONDS", "900"))
+    )
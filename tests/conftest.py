@@ -0,0 +1,47 @@
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Server modules import each other by bare name, as when run from src/
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def http_server(tmp_path_factory):
+    """The HTTP server module, imported from a scratch directory"""
+    pytest.importorskip("starlette")
+    pytest.importorskip("httpx")
+    # The server opens its log file under the working directory on import
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp("server"))
+        import mcp_server_http
+    return mcp_server_http
+
+
+@pytest.fixture
+def app_client(http_server, monkeypatch):
+    """Open an httpx client on create_app(), with Azure served by a fake on a free port"""
+    import httpx
+    from fake_azure import FakeAzure
+
+    @asynccontextmanager
+    async def open_client(**fake_options):
+        fake = FakeAzure(noise_images=False, **fake_options)
+        async with fake.serve() as base_url:
+            monkeypatch.setenv("AZURE_BASE_URL", base_url)
+            monkeypatch.setenv("AZURE_API_KEY", "fake-api-key-0000")
+            monkeypatch.setenv("AZURE_DEPLOYMENT_NAME", "fake-deployment")
+            monkeypatch.delenv("AZURE_ENDPOINTS", raising=False)
+            transport = httpx.ASGITransport(app=http_server.create_app())
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=30) as client:
+                    yield client
+            finally:
+                await http_server.close_generator()
+
+    return open_client
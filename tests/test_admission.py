@@ -0,0 +1,140 @@
+"""
+AdmissionLimiter tests: FIFO admission, rejection when the queue is full,
+and slot handoff when a queued caller times out
+"""
+
+import asyncio
+
+import pytest
+
+import admission
+from admission import AdmissionLimiter, QueueFullError
+
+
+def test_queued_callers_are_admitted_in_fifo_order():
+    async def scenario():
+        limiter = AdmissionLimiter(max_concurrent=1, max_queue=10)
+        order = []
+
+        async def caller(name: str):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await limiter.acquire()
+        tasks = []
+        for name in "abcde":
+            tasks.append(asyncio.create_task(caller(name)))
+            await asyncio.sleep(0)
+        assert limiter.queue_depth == 5
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return limiter, order
+
+    limiter, order = asyncio.run(scenario())
+    assert order == list("abcde")
+    assert limiter.active == 0
+    assert limiter.stats()["admitted"] == 6
+
+
+def test_new_caller_does_not_overtake_the_queue():
+    async def scenario():
+        limiter = AdmissionLimiter(max_concurrent=1, max_queue=10)
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # The slot goes to the queued caller, not to a newcomer
+        limiter.release()
+        newcomer = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert queued.done() and not newcomer.done()
+        limiter.release()
+        await newcomer
+        limiter.release()
+        return limiter
+
+    assert asyncio.run(scenario()).active == 0
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        limiter = AdmissionLimiter(max_concurrent=2, max_queue=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        waiters = [asyncio.create_task(limiter.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError, match="2 upstream calls in progress and 2 queued"):
+            await limiter.acquire()
+        assert limiter.stats()["rejected"] == 1
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        # Cancelled waiters leave the queue without taking a slot
+        assert limiter.queue_depth == 0
+        limiter.release()
+        limiter.release()
+        return limiter
+
+    assert asyncio.run(scenario()).active == 0
+
+
+def test_timed_out_caller_does_not_hold_a_slot():
+    async def scenario():
+        limiter = AdmissionLimiter(max_concurrent=1, max_queue=10, queue_timeout=0.05)
+        await limiter.acquire()
+        impatient = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await impatient
+        limiter.queue_timeout = None
+        patient = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        await patient
+        assert limiter.active == 1
+        limiter.release()
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.active == 0
+    assert limiter.stats()["timed_out"] == 1
+
+
+def test_slot_granted_at_timeout_is_passed_on(monkeypatch):
+    limiter = AdmissionLimiter(max_concurrent=1, max_queue=10, queue_timeout=1.0)
+
+    async def wait_for_then_time_out(awaitable, timeout):
+        # The holder releases, handing its slot to this waiter, just as the timeout fires
+        awaitable.cancel()
+        limiter.release()
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        await limiter.acquire()
+        with monkeypatch.context() as mp:
+            mp.setattr(admission.asyncio, "wait_for", wait_for_then_time_out)
+            with pytest.raises(QueueFullError):
+                await limiter.acquire()
+        # The handed-over slot was released again rather than leaked
+        assert limiter.active == 0
+        await limiter.acquire()
+        assert limiter.active == 1
+        limiter.release()
+
+    asyncio.run(scenario())
+
+
+def test_image_worker_rejections_name_the_worker_pool():
+    from image_workers import ImageWorkers
+
+    async def scenario():
+        workers = ImageWorkers(max_workers=1, max_queue=0)
+        await workers.limiter.acquire()
+        try:
+            with pytest.raises(QueueFullError, match="Server busy: 1 image worker calls in progress and 0 queued"):
+                await workers.run(len, b"png")
+        finally:
+            workers.limiter.release()
+            workers.shutdown()
+
+    asyncio.run(scenario())
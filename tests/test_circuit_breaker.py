@@ -0,0 +1,79 @@
+"""
+CircuitBreaker tests: closed -> open -> half-open -> closed, and
+reopening when a half-open probe fails
+"""
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def call(breaker: CircuitBreaker, failed: bool = False, duration: float = 0.1):
+    breaker.before_call()
+    breaker.record(failed, duration)
+
+
+def tripped(open_seconds: float) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_rate_threshold=0.5, window_size=4, min_calls=4, open_seconds=open_seconds)
+    for failed in (False, True, False, True):
+        call(breaker, failed)
+    return breaker
+
+
+def test_stays_closed_below_min_calls_and_threshold():
+    breaker = CircuitBreaker(failure_rate_threshold=0.5, window_size=4, min_calls=4)
+    for _ in range(3):
+        call(breaker, failed=True)
+    assert breaker.state == CLOSED
+    breaker = CircuitBreaker(failure_rate_threshold=0.5, window_size=4, min_calls=4)
+    for failed in (True, False, False, False, True, False):
+        call(breaker, failed)
+    assert breaker.state == CLOSED
+
+
+def test_opens_at_failure_rate_and_rejects_calls():
+    breaker = tripped(open_seconds=60)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert not breaker.allows_call()
+    stats = breaker.stats()
+    assert stats["times_opened"] == 1 and stats["rejected"] == 1
+
+
+def test_opens_on_slow_calls():
+    breaker = CircuitBreaker(slow_call_seconds=1.0, slow_call_rate_threshold=0.75, window_size=4, min_calls=4)
+    for duration in (2.0, 2.0, 0.1, 2.0):
+        call(breaker, duration=duration)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_success_closes():
+    breaker = tripped(open_seconds=0)
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    # Only half_open_max_calls probes are let through at once
+    assert not breaker.allows_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_failed_probe_reopens():
+    breaker = tripped(open_seconds=0)
+    assert breaker.state == HALF_OPEN
+    breaker.open_seconds = 60
+    breaker.before_call()
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_ignored_probe_frees_its_slot():
+    breaker = tripped(open_seconds=0)
+    breaker.before_call()
+    breaker.record_ignored()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allows_call()
@@ -0,0 +1,166 @@
+"""
+ImageCache tests: memory LRU by bytes, the disk size cap, rebuilding the
+disk index after a restart, the hit/miss counters, and edit results keyed
+by the input image bytes
+"""
+
+import asyncio
+import io
+import os
+
+import httpx
+
+from azure_image_client import AzureImageGenerator
+from fake_azure import FakeAzure
+from image_cache import ImageCache, make_cache_key
+
+
+def key(name: str) -> str:
+    return make_cache_key(prompt=name)
+
+
+def test_cache_key_ignores_whitespace_and_case_only():
+    assert make_cache_key(prompt="A  red\nsquare", size="1024X1024 ") == make_cache_key(prompt="A red square", size="1024x1024")
+    assert make_cache_key(prompt="A red square") != make_cache_key(prompt="a red square")
+    assert make_cache_key(prompt="x", n=1) != make_cache_key(prompt="x", n=2)
+
+
+def test_memory_tier_evicts_least_recently_used_by_bytes():
+    async def scenario():
+        cache = ImageCache(max_memory_bytes=250)
+        await cache.put(key("a"), b"a" * 100)
+        await cache.put(key("b"), b"b" * 100)
+        # Touch a, so b is the least recently used
+        assert await cache.get(key("a")) == b"a" * 100
+        await cache.put(key("c"), b"c" * 100)
+        return cache, [await cache.get(key(name)) for name in "abc"]
+
+    cache, (a, b, c) = asyncio.run(scenario())
+    assert a == b"a" * 100 and b is None and c == b"c" * 100
+    stats = cache.stats()
+    assert stats["memory_entries"] == 2 and stats["memory_bytes"] == 200
+    assert stats["evictions"] == 1
+
+
+def test_entries_larger_than_memory_tier_are_not_kept_in_memory():
+    async def scenario():
+        cache = ImageCache(max_memory_bytes=50)
+        await cache.put(key("small"), b"s" * 10)
+        await cache.put(key("large"), b"l" * 100)
+        return cache, await cache.get(key("small")), await cache.get(key("large"))
+
+    cache, small, large = asyncio.run(scenario())
+    assert small == b"s" * 10 and large is None
+    assert cache.stats()["evictions"] == 0
+
+
+def test_disk_tier_evicts_least_recently_used_files_over_the_cap(tmp_path):
+    async def scenario():
+        cache = ImageCache(str(tmp_path), max_memory_bytes=0, max_disk_bytes=250)
+        await cache.put(key("a"), b"a" * 100)
+        await cache.put(key("b"), b"b" * 100)
+        assert await cache.get(key("a")) == b"a" * 100
+        await cache.put(key("c"), b"c" * 100)
+        return cache, [await cache.get(key(name)) for name in "abc"]
+
+    cache, (a, b, c) = asyncio.run(scenario())
+    assert a == b"a" * 100 and b is None and c == b"c" * 100
+    assert not cache._path_for(key("b")).exists()
+    assert sorted(path.stem for path in tmp_path.glob("*/*.bin")) == sorted([key("a"), key("c")])
+    assert cache.stats()["disk_bytes"] == 200
+
+
+def test_disk_index_is_rebuilt_after_restart_oldest_first(tmp_path):
+    async def fill():
+        cache = ImageCache(str(tmp_path))
+        for age, name in enumerate("cba"):
+            await cache.put(key(name), name.encode() * 100)
+            # a is the oldest file, c the newest
+            os.utime(cache._path_for(key(name)), (1000 - age, 1000 - age))
+
+    asyncio.run(fill())
+
+    async def restart():
+        cache = ImageCache(str(tmp_path), max_disk_bytes=250)
+        return cache, [await cache.get(key(name)) for name in "abc"]
+
+    cache, (a, b, c) = asyncio.run(restart())
+    # The restart trims the oldest file to fit the new cap
+    assert a is None and b == b"b" * 100 and c == b"c" * 100
+    stats = cache.stats()
+    assert stats["disk_entries"] == 2 and stats["disk_bytes"] == 200
+    assert stats["disk_hits"] == 2 and stats["misses"] == 1
+
+
+def test_hit_and_miss_counters(tmp_path):
+    async def scenario():
+        cache = ImageCache(str(tmp_path))
+        await cache.get(key("a"))
+        await cache.put(key("a"), b"png")
+        await cache.get(key("a"))
+        # A fresh instance over the same directory only has the disk tier
+        restarted = ImageCache(str(tmp_path))
+        await restarted.get(key("a"))
+        await restarted.get(key("a"))
+        return cache.stats(), restarted.stats()
+
+    first, restarted = asyncio.run(scenario())
+    assert (first["memory_hits"], first["disk_hits"], first["misses"]) == (1, 0, 1)
+    assert first["hit_ratio"] == 0.5
+    # The disk hit is promoted into memory, so the second lookup is a memory hit
+    assert (restarted["memory_hits"], restarted["disk_hits"], restarted["misses"]) == (1, 1, 0)
+    assert restarted["hit_ratio"] == 1.0
+
+
+def test_deleted_disk_file_is_a_miss_and_leaves_the_index(tmp_path):
+    async def scenario():
+        cache = ImageCache(str(tmp_path), max_memory_bytes=0)
+        await cache.put(key("a"), b"a" * 100)
+        cache._path_for(key("a")).unlink()
+        return cache, await cache.get(key("a"))
+
+    cache, data = asyncio.run(scenario())
+    assert data is None
+    assert cache.stats()["disk_entries"] == 0 and cache.stats()["disk_bytes"] == 0
+    assert cache.misses == 1
+
+
+def png(color: str) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_edit_cache_key_follows_the_image_bytes():
+    generator = AzureImageGenerator("http://fake", "fake-api-key-0000", "deployment")
+    try:
+        red = generator.edit_cache_key(png("red"), "Add a hat", None)
+        assert generator.edit_cache_key(png("red"), "Add  a hat", None) == red
+        assert generator.edit_cache_key(png("blue"), "Add a hat", None) != red
+        assert generator.edit_cache_key(png("red"), "Add a scarf", None) != red
+        assert generator.edit_cache_key(png("red"), "Add a hat", "64x64") != red
+    finally:
+        asyncio.run(generator.aclose())
+
+
+def test_repeated_edits_hit_the_cache_until_the_image_changes(tmp_path):
+    fake = FakeAzure(noise_images=False)
+
+    async def scenario():
+        cache = ImageCache(str(tmp_path))
+        generator = AzureImageGenerator("http://fake", "fake-api-key-0000", "deployment", cache=cache, coalesce=False)
+        await generator.client.aclose()
+        generator.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app))
+        async with generator:
+            first = await generator.edit_image(image_data=png("red"), prompt="Add a hat", return_bytes=True)
+            second = await generator.edit_image(image_data=png("red"), prompt="Add a hat", return_bytes=True)
+            assert fake.requests == 1
+            await generator.edit_image(image_data=png("blue"), prompt="Add a hat", return_bytes=True)
+        return cache, first, second
+
+    cache, first, second = asyncio.run(scenario())
+    assert second == first
+    assert fake.requests == 2
+    assert (cache.memory_hits, cache.misses) == (1, 2)
@@ -0,0 +1,75 @@
+"""
+Result delivery tests: IMAGE_DELIVERY=url against the fake Azure service,
+for clients on and before protocol 2025-06-18
+"""
+
+import asyncio
+
+import pytest
+
+from image_store import ImageStore
+
+
+def generate_request() -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "tools/call",
+        "params": {"name": "generate_image", "arguments": {"prompt": "A red square", "size": "1024x1024"}}
+    }
+
+
+@pytest.fixture
+def url_delivery(http_server, monkeypatch, tmp_path):
+    monkeypatch.setenv("IMAGE_DELIVERY", "url")
+    monkeypatch.setattr(http_server, "_image_store", ImageStore(str(tmp_path / "store")))
+    return http_server
+
+
+def call_generate(app_client, headers: dict[str, str]) -> tuple[dict, bytes]:
+    """Call generate_image, then fetch the linked image from /images"""
+    async def scenario():
+        async with app_client() as client:
+            response = await client.post("/", json=generate_request(), headers=headers)
+            content = response.json()["result"]["content"]
+            link = next((part.get("uri") for part in content if part["type"] == "resource_link"), None)
+            if link is None:
+                text = " ".join(part["text"] for part in content if part["type"] == "text")
+                link = text.split("Image stored at: ")[1].split()[0]
+            image = await client.get(link)
+            assert image.status_code == 200
+            return content, image.content
+
+    return asyncio.run(scenario())
+
+
+def test_new_clients_get_resource_link_and_thumbnail(url_delivery, app_client):
+    content, image = call_generate(app_client, {"MCP-Protocol-Version": "2025-06-18"})
+
+    assert [part["type"] for part in content] == ["text", "resource_link", "image"]
+    link = content[1]
+    assert link["uri"].startswith("http://testserver/images/")
+    assert link["size"] == len(image)
+    assert content[2]["mimeType"] == "image/jpeg"
+
+
+def test_older_clients_get_text_link_and_thumbnail_without_full_image(url_delivery, app_client):
+    content, image = call_generate(app_client, {})
+
+    assert [part["type"] for part in content] == ["text", "text", "image"]
+    assert "http://testserver/images/" in content[1]["text"]
+    # Only the thumbnail is inlined, never the full image
+    assert content[2]["mimeType"] == "image/jpeg"
+    assert len(content[2]["data"]) < len(image)
+    assert url_delivery.has_image({"content": content})
+
+
+def test_older_clients_fall_back_to_inline_image_when_workers_are_full(url_delivery, app_client, monkeypatch):
+    async def full(*args, **kwargs):
+        raise url_delivery.QueueFullError("Image workers busy")
+
+    monkeypatch.setattr(url_delivery._image_workers, "run", full)
+    content, image = call_generate(app_client, {"MCP-Protocol-Version": "2025-03-26"})
+
+    assert [part["type"] for part in content] == ["text", "text", "image"]
+    assert content[2]["mimeType"] == "image/png"
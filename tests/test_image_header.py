@@ -0,0 +1,122 @@
+import io
+import struct
+
+import pytest
+
+from image_header import ImageHeader, check_image_limits, sniff_image
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import features
+
+requires_webp = pytest.mark.skipif(not features.check("webp"), reason="Pillow built without WebP support")
+
+
+def encode(mode: str, size: tuple[int, int], image_format: str, **options) -> bytes:
+    """Save a solid-color image with PIL, the way real uploads are produced"""
+    buffer = io.BytesIO()
+    # Half-transparent, so encoders keep the alpha channel
+    color = (255, 0, 0, 128) if mode == "RGBA" else "red"
+    Image.new(mode, size, color).save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def exif_bytes() -> bytes:
+    exif = Image.Exif()
+    exif[0x010F] = "Test Camera"
+    exif[0x0110] = "x" * 2000
+    return exif.tobytes()
+
+
+@pytest.mark.parametrize("mode, image_format, options, expected", [
+    ("RGB", "PNG", {}, "png"),
+    ("RGBA", "PNG", {}, "png"),
+    ("L", "PNG", {}, "png"),
+    ("RGB", "JPEG", {}, "jpeg"),
+    ("RGB", "JPEG", {"progressive": True}, "jpeg"),
+    ("RGB", "JPEG", {"exif": exif_bytes()}, "jpeg"),
+    ("L", "JPEG", {"optimize": True}, "jpeg"),
+    pytest.param("RGB", "WEBP", {}, "webp", marks=requires_webp),
+    pytest.param("RGB", "WEBP", {"lossless": True}, "webp", marks=requires_webp),
+    pytest.param("RGBA", "WEBP", {}, "webp", marks=requires_webp),
+    pytest.param("RGBA", "WEBP", {"lossless": True}, "webp", marks=requires_webp),
+])
+def test_sniff_matches_pil(mode, image_format, options, expected):
+    data = encode(mode, (333, 77), image_format, **options)
+
+    header = sniff_image(data)
+
+    assert header == ImageHeader(expected, f"image/{expected}", 333, 77)
+    assert header.pixels == 333 * 77
+    assert header.filename == f"image.{expected}"
+
+
+@requires_webp
+def test_webp_variants_use_each_chunk_type():
+    chunks = {
+        encode("RGB", (10, 10), "WEBP")[12:16],
+        encode("RGB", (10, 10), "WEBP", lossless=True)[12:16],
+        encode("RGBA", (10, 10), "WEBP")[12:16],
+    }
+    assert chunks == {b"VP8 ", b"VP8L", b"VP8X"}
+
+
+def test_jpeg_fill_bytes_before_markers_are_skipped():
+    data = encode("RGB", (640, 480), "JPEG")
+    # Pad the first segment marker after SOI with fill bytes
+    padded = data[:2] + b"\xff\xff\xff" + data[2:]
+
+    assert sniff_image(padded)[2:] == (640, 480)
+
+
+def test_jpeg_segments_before_the_frame_are_skipped():
+    data = encode("RGB", (640, 480), "JPEG")
+    # A DHT segment (0xC4) sits in the SOF range but is not a frame header
+    dht = b"\xff\xc4" + struct.pack(">H", 6) + b"\x00\x01\x02\x03"
+    comment = b"\xff\xfe" + struct.pack(">H", 7) + b"hello"
+
+    assert sniff_image(data[:2] + dht + comment + data[2:])[2:] == (640, 480)
+
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG", pytest.param("WEBP", marks=requires_webp)])
+def test_truncated_headers_are_rejected(image_format):
+    data = encode("RGB", (64, 64), image_format)
+
+    with pytest.raises(ValueError):
+        sniff_image(data[:20])
+
+
+def test_jpeg_cut_before_the_frame_is_rejected():
+    data = encode("RGB", (64, 64), "JPEG", exif=exif_bytes())
+
+    with pytest.raises(ValueError, match="JPEG frame header not found"):
+        sniff_image(data[:200])
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"not an image at all",
+    b"GIF89a" + b"\x00" * 32,
+    b"RIFF\x00\x00\x00\x00WAVEfmt ",
+    b"\xff\xd8\xff" + b"\x00" * 16,
+    b"RIFF\x00\x00\x00\x00WEBPJUNK" + b"\x00" * 32,
+])
+def test_garbage_is_rejected(data):
+    with pytest.raises(ValueError):
+        sniff_image(data)
+
+
+def test_zero_dimensions_are_rejected():
+    data = bytearray(encode("RGB", (8, 8), "PNG"))
+    data[16:24] = struct.pack(">II", 0, 8)
+
+    with pytest.raises(ValueError, match="Invalid image dimensions"):
+        sniff_image(bytes(data))
+
+
+def test_check_image_limits():
+    header = ImageHeader("png", "image/png", 4096, 4096)
+
+    check_image_limits(header, 4096 * 4096)
+    check_image_limits(header, 0)
+    with pytest.raises(ValueError, match="4096x4096 is 16777216 pixels, the limit is 16777215"):
+        check_image_limits(header, 4096 * 4096 - 1)
@@ -0,0 +1,215 @@
+"""
+JobStore tests: queueing behind max_concurrent, job lifecycle, TTL purge,
+and eviction of the oldest finished jobs by count and by result bytes
+"""
+
+import asyncio
+
+import pytest
+
+from job_store import FAILED, QUEUED, RUNNING, SUCCEEDED, JobStore, JobStoreFullError, result_size
+
+
+def image_result(size: int) -> dict:
+    return {"content": [{"type": "image", "data": "x" * size, "mimeType": "image/png"}]}
+
+
+def has_image(result: dict) -> bool:
+    return any(part["type"] == "image" for part in result["content"])
+
+
+def test_jobs_queue_behind_max_concurrent_and_finish_in_order():
+    async def scenario():
+        store = JobStore(max_concurrent=1)
+        gates = [asyncio.Event(), asyncio.Event()]
+
+        async def run(index: int):
+            await gates[index].wait()
+            return image_result(10)
+
+        first = store.submit("generate", lambda: run(0), has_image)
+        second = store.submit("generate", lambda: run(1), has_image)
+        assert first.status == QUEUED and second.status == QUEUED
+
+        await asyncio.sleep(0)
+        assert first.status == RUNNING and first.started_at is not None
+        assert second.status == QUEUED and second.started_at is None
+        assert store.stats()[QUEUED] == 1
+
+        gates[0].set()
+        await asyncio.sleep(0.01)
+        assert first.status == SUCCEEDED and first.result == image_result(10)
+        assert second.status == RUNNING
+
+        gates[1].set()
+        await second.task
+        return store, second
+
+    store, second = asyncio.run(scenario())
+    assert second.status == SUCCEEDED
+    assert store.result_bytes == 2 * result_size(image_result(10))
+    assert store.stats()[SUCCEEDED] == 2
+
+
+def test_failed_results_and_exceptions_keep_only_the_error():
+    async def scenario():
+        store = JobStore()
+
+        async def tool_error():
+            return {"content": [{"type": "text", "text": "Prompt must be in English"}]}
+
+        async def crash():
+            raise RuntimeError("boom")
+
+        failed = store.submit("generate", tool_error, has_image)
+        crashed = store.submit("edit", crash, has_image)
+        await asyncio.gather(failed.task, crashed.task)
+        return store, failed, crashed
+
+    store, failed, crashed = asyncio.run(scenario())
+    assert failed.status == FAILED and failed.error == "Prompt must be in English"
+    assert failed.result is None
+    assert crashed.status == FAILED and crashed.error == "boom"
+    assert store.result_bytes == 0
+    assert store.stats()[FAILED] == 2
+
+
+def test_aclose_cancels_queued_and_running_jobs():
+    async def scenario():
+        store = JobStore(max_concurrent=1)
+        never = asyncio.Event()
+
+        async def run():
+            await never.wait()
+            return image_result(1)
+
+        jobs = [store.submit("generate", run, has_image) for _ in range(2)]
+        await asyncio.sleep(0)
+        await store.aclose()
+        return jobs
+
+    for job in asyncio.run(scenario()):
+        assert job.status == FAILED and job.error == "Job cancelled"
+
+
+def test_finished_jobs_expire_after_ttl():
+    async def scenario():
+        store = JobStore(ttl_seconds=60)
+
+        async def run():
+            return image_result(100)
+
+        job = store.submit("generate", run, has_image)
+        await job.task
+        assert store.get(job.id) is job
+        job.finished_at -= 61
+        return store, job
+
+    store, job = asyncio.run(scenario())
+    assert store.get(job.id) is None
+    assert store.result_bytes == 0
+    assert store.stats()["jobs"] == 0
+
+
+def test_full_store_evicts_the_oldest_finished_job():
+    async def scenario():
+        store = JobStore(max_jobs=2)
+        never = asyncio.Event()
+
+        async def done():
+            return image_result(1)
+
+        async def stuck():
+            await never.wait()
+            return image_result(1)
+
+        running = store.submit("generate", stuck, has_image)
+        finished = store.submit("generate", done, has_image)
+        await finished.task
+        newest = store.submit("generate", done, has_image)
+        await newest.task
+        result = store, running, finished, newest
+        await store.aclose()
+        return result
+
+    store, running, finished, newest = asyncio.run(scenario())
+    assert store.get(finished.id) is None
+    assert store.get(running.id) is running
+    assert store.get(newest.id) is newest
+    assert store.evicted == 1
+
+
+def test_full_store_rejects_when_every_job_is_live():
+    async def scenario():
+        store = JobStore(max_jobs=2, max_concurrent=1)
+        never = asyncio.Event()
+
+        async def stuck():
+            await never.wait()
+            return image_result(1)
+
+        store.submit("generate", stuck, has_image)
+        store.submit("generate", stuck, has_image)
+        try:
+            with pytest.raises(JobStoreFullError, match="2 jobs still queued or running"):
+                store.submit("generate", stuck, has_image)
+        finally:
+            await store.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_result_byte_cap_evicts_oldest_finished_but_never_the_job_just_finished():
+    async def scenario():
+        store = JobStore(max_result_bytes=250)
+        never = asyncio.Event()
+
+        async def result(size: int):
+            return image_result(size)
+
+        async def stuck():
+            await never.wait()
+            return image_result(1)
+
+        running = store.submit("generate", stuck, has_image)
+        jobs = []
+        for _ in range(2):
+            job = store.submit("generate", lambda: result(100), has_image)
+            await job.task
+            jobs.append(job)
+        # Needs both older results gone to fit, then is kept even though it is still over
+        large = store.submit("generate", lambda: result(300), has_image)
+        await large.task
+        try:
+            oldest, middle = jobs
+            assert store.get(oldest.id) is None
+            assert store.get(middle.id) is None
+            assert store.get(large.id) is large and large.result == image_result(300)
+            assert store.get(running.id) is running
+            assert store.result_bytes == result_size(image_result(300))
+            assert store.evicted == 2
+        finally:
+            await store.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_result_byte_cap_stops_once_under_the_limit():
+    async def scenario():
+        store = JobStore(max_result_bytes=250)
+
+        async def result():
+            return image_result(100)
+
+        jobs = []
+        for _ in range(3):
+            job = store.submit("generate", result, has_image)
+            await job.task
+            jobs.append(job)
+        return store, jobs
+
+    store, (oldest, middle, newest) = asyncio.run(scenario())
+    assert store.get(oldest.id) is None
+    assert store.get(middle.id) is middle
+    assert store.get(newest.id) is newest
+    assert store.evicted == 1
@@ -0,0 +1,113 @@
+"""
+EndpointBalancer tests: ejection and readmission, skipping endpoints whose
+circuit is open, and one failing deployment not blocking a healthy one
+"""
+
+import asyncio
+
+import httpx
+
+from azure_image_client import AzureImageGenerator
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from fake_azure import FakeAzure
+from load_balancer import Endpoint, EndpointBalancer
+from retry import RetryPolicy
+
+
+def endpoints(*names: str, **kwargs) -> list[Endpoint]:
+    return [Endpoint(f"http://{name}", "fake-api-key-0000", "deployment", name=name, **kwargs) for name in names]
+
+
+def test_ejects_after_consecutive_failures_and_readmits(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("load_balancer.time.monotonic", lambda: now[0])
+    good, bad = endpoints("good", "bad")
+    balancer = EndpointBalancer([good, bad], eject_after_failures=3, eject_seconds=30)
+
+    for _ in range(2):
+        balancer.start(bad)
+        balancer.finish(bad, True, 0.1)
+    assert not bad.is_ejected(now[0])
+    balancer.start(bad)
+    balancer.finish(bad, True, 0.1)
+    assert bad.is_ejected(now[0])
+    assert all(balancer.pick() is good for _ in range(20))
+
+    now[0] += 30
+    assert not bad.is_ejected(now[0])
+    assert bad in {balancer.pick() for _ in range(50)}
+    # One more failure after readmission ejects it again
+    balancer.start(bad)
+    balancer.finish(bad, True, 0.1)
+    assert bad.is_ejected(now[0])
+    assert balancer.stats()[1]["ejections"] == 2
+
+
+def test_success_resets_consecutive_failures():
+    (endpoint,) = endpoints("only")
+    balancer = EndpointBalancer([endpoint], eject_after_failures=2)
+    for failed in (True, False, True, False, True):
+        balancer.start(endpoint)
+        balancer.finish(endpoint, failed, 0.1)
+    assert not endpoint.is_ejected(0)
+    assert endpoint.outstanding == 0
+
+
+def test_retries_prefer_untried_endpoints():
+    first, second = endpoints("first", "second")
+    balancer = EndpointBalancer([first, second])
+    assert balancer.pick(exclude=[first]) is second
+    # With everything tried, any healthy endpoint is used again
+    assert balancer.pick(exclude=[first, second]) in (first, second)
+
+
+def test_all_ejected_fails_open_to_soonest_readmission():
+    first, second = endpoints("first", "second")
+    balancer = EndpointBalancer([first, second])
+    first.ejected_until = float("inf")
+    second.ejected_until = 10 ** 12
+    assert balancer.pick() is second
+
+
+def test_skips_endpoints_whose_circuit_is_open():
+    good, bad = endpoints("good", "bad")
+    good.breaker = CircuitBreaker("good")
+    bad.breaker = CircuitBreaker("bad", window_size=2, min_calls=2, open_seconds=60)
+    for _ in range(2):
+        bad.breaker.before_call()
+        bad.breaker.record(True, 0.1)
+    balancer = EndpointBalancer([good, bad])
+    assert all(balancer.pick() is good for _ in range(20))
+
+
+def test_failing_deployment_does_not_open_the_healthy_one():
+    async def scenario():
+        good, bad = FakeAzure(noise_images=False), FakeAzure(rate_5xx=1.0, retry_after=None, noise_images=False)
+        pool = endpoints("good", "bad")
+        for endpoint in pool:
+            endpoint.breaker = CircuitBreaker(endpoint.name)
+        generator = AzureImageGenerator(
+            "http://good", "fake-api-key-0000", "deployment",
+            coalesce=False,
+            balancer=EndpointBalancer(pool),
+            retry_policies={"generate": RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)}
+        )
+        await generator.client.aclose()
+        generator.client = httpx.AsyncClient(mounts={
+            "http://good": httpx.ASGITransport(app=good.app),
+            "http://bad": httpx.ASGITransport(app=bad.app),
+        })
+        rejected = 0
+        async with generator:
+            for i in range(40):
+                try:
+                    await generator.generate_image(f"prompt {i}", "64x64", return_bytes=True)
+                except CircuitOpenError:
+                    rejected += 1
+        return rejected, pool
+
+    rejected, (good, bad) = asyncio.run(scenario())
+    assert rejected == 0
+    assert good.breaker.state == "closed"
+    assert bad.breaker.state == "open"
+    assert good.failures == 0
@@ -0,0 +1,179 @@
+"""
+MCP resource tests: resources/list paging, resources/read and
+resources/templates/list over create_app(), and ImageStore expiry and
+index rebuilding
+"""
+
+import asyncio
+import base64
+import io
+import os
+import time
+
+import pytest
+
+from image_store import ImageStore, parse_resource_uri
+
+
+def png(index: int) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (index, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def rpc(method: str, params: dict | None = None, request_id: int = 1) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+
+
+@pytest.fixture
+def store(http_server, monkeypatch, tmp_path):
+    image_store = ImageStore(str(tmp_path / "store"))
+    monkeypatch.setenv("IMAGE_DELIVERY", "resource")
+    monkeypatch.setattr(http_server, "_image_store", image_store)
+    return image_store
+
+
+def call(app_client, *messages: dict) -> list[dict]:
+    async def scenario():
+        async with app_client() as client:
+            return [(await client.post("/", json=message)).json() for message in messages]
+
+    return asyncio.run(scenario())
+
+
+def test_initialize_advertises_resources(store, app_client):
+    (response,) = call(app_client, rpc("initialize", {"protocolVersion": "2025-06-18"}))
+
+    assert response["result"]["capabilities"]["resources"] == {}
+
+
+def test_list_pages_through_entries_stored_in_the_same_clock_tick(store, app_client, http_server, monkeypatch):
+    monkeypatch.setattr(http_server, "RESOURCES_PAGE_SIZE", 2)
+    tick = time.time()
+    with monkeypatch.context() as mp:
+        mp.setattr("image_store.time.time", lambda: tick)
+        digests = [asyncio.run(store.put(png(i))).digest for i in range(5)]
+
+    listed, cursor, pages = [], None, 0
+    while True:
+        params = {"cursor": cursor} if cursor is not None else {}
+        (response,) = call(app_client, rpc("resources/list", params))
+        result = response["result"]
+        listed += [parse_resource_uri(resource["uri"]) for resource in result["resources"]]
+        pages += 1
+        cursor = result.get("nextCursor")
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert sorted(listed) == sorted(digests)
+    assert len(listed) == len(set(listed))
+
+
+def test_list_rejects_a_malformed_cursor(store, app_client):
+    asyncio.run(store.put(png(1)))
+
+    responses = call(
+        app_client,
+        rpc("resources/list", {"cursor": "not-a-cursor"}),
+        rpc("resources/list", {"cursor": "1000.0:xyz"}),
+    )
+
+    assert [response["error"]["code"] for response in responses] == [-32602, -32602]
+
+
+def test_read_returns_the_stored_bytes(store, app_client):
+    data = png(7)
+    stored = asyncio.run(store.put(data))
+
+    (response,) = call(app_client, rpc("resources/read", {"uri": stored.uri}))
+
+    (contents,) = response["result"]["contents"]
+    assert contents["uri"] == stored.uri
+    assert contents["mimeType"] == "image/png"
+    assert base64.b64decode(contents["blob"]) == data
+
+
+def test_read_errors(store, app_client):
+    stored = asyncio.run(store.put(png(7)))
+    stored.path.unlink()
+
+    missing, unknown, invalid = call(
+        app_client,
+        rpc("resources/read", {"uri": stored.uri}),
+        rpc("resources/read", {"uri": "image://" + "0" * 64}),
+        rpc("resources/read", {"uri": "https://example.com/a.png"}),
+    )
+
+    assert missing["error"]["code"] == -32002
+    assert unknown["error"]["code"] == -32002
+    assert invalid["error"]["code"] == -32602
+    assert store.get(stored.digest) is None
+
+
+def test_templates_list(store, app_client):
+    (response,) = call(app_client, rpc("resources/templates/list"))
+
+    (template,) = response["result"]["resourceTemplates"]
+    assert template["uriTemplate"] == "image://{digest}"
+
+
+def test_resource_methods_are_not_found_with_inline_delivery(http_server, app_client, monkeypatch):
+    monkeypatch.setattr(http_server, "_image_store", None)
+
+    responses = call(app_client, rpc("resources/list"), rpc("resources/read", {"uri": "image://" + "0" * 64}))
+
+    assert [response["error"]["code"] for response in responses] == [-32601, -32601]
+
+
+def test_store_dedups_and_restarts_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("image_store.time.time", lambda: now[0])
+    store = ImageStore(str(tmp_path), ttl_seconds=60)
+
+    first = asyncio.run(store.put(png(1)))
+    now[0] += 50
+    again = asyncio.run(store.put(png(1)))
+    now[0] += 50
+
+    assert again.path == first.path and again.created_at == 1050.0
+    assert store.get(first.digest) == again
+    assert store.stats()["entries"] == 1 and store.stats()["bytes"] == first.size
+
+
+def test_store_expires_entries_and_deletes_their_files(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("image_store.time.time", lambda: now[0])
+    store = ImageStore(str(tmp_path), ttl_seconds=60)
+    old = asyncio.run(store.put(png(1)))
+    now[0] += 30
+    recent = asyncio.run(store.put(png(2)))
+    now[0] += 31
+
+    assert store.get(old.digest) is None
+    assert asyncio.run(store.read(old.digest)) is None
+    assert [entry.digest for entry in store.entries()] == [recent.digest]
+    # Expired files are deleted by the next write
+    asyncio.run(store.put(png(3)))
+    assert not old.path.exists() and recent.path.exists()
+    assert store.stats()["evictions"] == 1
+
+
+def test_store_rebuilds_its_index_and_drops_expired_files_on_restart(tmp_path, monkeypatch):
+    store = ImageStore(str(tmp_path), ttl_seconds=60)
+    old, recent = [asyncio.run(store.put(png(i))) for i in (1, 2)]
+    os.utime(old.path, (1000, 1000))
+    os.utime(recent.path, (1050, 1050))
+    (tmp_path / "ab").mkdir(exist_ok=True)
+    (tmp_path / "ab" / "not-a-digest.png").write_bytes(b"x")
+
+    monkeypatch.setattr("image_store.time.time", lambda: 1070.0)
+    restarted = ImageStore(str(tmp_path), ttl_seconds=60)
+
+    assert [entry.digest for entry in restarted.entries()] == [recent.digest]
+    assert restarted.get(recent.digest).mime_type == "image/png"
+    assert restarted.get(recent.digest).created_at == 1050.0
+    assert not old.path.exists()
+    assert restarted.stats()["bytes"] == recent.size
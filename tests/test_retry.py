@@ -0,0 +1,87 @@
+"""
+Retry tests: Retry-After parsing, backoff limits and the shared retry budget
+"""
+
+import time
+from email.utils import formatdate
+
+import httpx
+
+from retry import RetryBudget, RetryPolicy, parse_retry_after
+
+
+def response(status: int = 429, **headers: str) -> httpx.Response:
+    return httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://azure.example/images"))
+
+
+def status_error(status: int, **headers: str) -> httpx.HTTPStatusError:
+    return httpx.HTTPStatusError("error", request=httpx.Request("POST", "https://azure.example"), response=response(status, **headers))
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after(response(**{"Retry-After": "7"})) == 7.0
+    assert parse_retry_after(response(**{"Retry-After": "-3"})) == 0.0
+
+
+def test_parse_retry_after_http_date():
+    delay = parse_retry_after(response(**{"Retry-After": formatdate(time.time() + 30, usegmt=True)}))
+    assert 28 <= delay <= 30
+    assert parse_retry_after(response(**{"Retry-After": formatdate(time.time() - 30, usegmt=True)})) == 0.0
+
+
+def test_parse_retry_after_milliseconds_wins():
+    assert parse_retry_after(response(**{"retry-after-ms": "250", "Retry-After": "10"})) == 0.25
+    assert parse_retry_after(response(**{"x-ms-retry-after-ms": "1500"})) == 1.5
+
+
+def test_parse_retry_after_missing_or_invalid():
+    assert parse_retry_after(response()) is None
+    assert parse_retry_after(response(**{"Retry-After": "soon"})) is None
+    # An unparseable millisecond header falls back to Retry-After
+    assert parse_retry_after(response(**{"retry-after-ms": "x", "Retry-After": "2"})) == 2.0
+
+
+def test_policy_retries_transient_errors_only():
+    policy = RetryPolicy()
+    assert policy.is_retryable(status_error(429))
+    assert policy.is_retryable(status_error(503))
+    assert not policy.is_retryable(status_error(400))
+    assert policy.is_retryable(httpx.ConnectError("reset"))
+    assert not RetryPolicy(retry_connection_errors=False).is_retryable(httpx.ConnectError("reset"))
+
+
+def test_delay_honors_retry_after_within_max_delay():
+    policy = RetryPolicy(base_delay=0.1, max_delay=5)
+    assert policy.delay_for(status_error(429, **{"Retry-After": "3"}), 0.0) >= 3.0
+    # The server asks for longer than we are willing to wait: give up
+    assert policy.delay_for(status_error(429, **{"Retry-After": "60"}), 0.0) is None
+    for previous in (0.0, 1.0, 10.0):
+        assert 0.1 <= policy.delay_for(status_error(503), previous) <= 5
+
+
+def test_budget_is_exhausted_and_refills_from_requests():
+    budget = RetryBudget(ratio=0.5, min_retries_per_second=0.0, max_tokens=2.0)
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.stats()["exhausted"] == 1
+    # Two requests earn one retry
+    budget.record_request()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert budget.try_spend()
+    assert budget.stats()["exhausted"] == 2
+
+
+def test_budget_refills_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("retry.time.monotonic", lambda: now[0])
+    budget = RetryBudget(ratio=0.0, min_retries_per_second=1.0, max_tokens=1.0)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    now[0] += 1.0
+    assert budget.try_spend()
+    # Tokens are capped at max_tokens however long the budget sits idle
+    now[0] += 100.0
+    assert budget.try_spend()
+    assert not budget.try_spend()
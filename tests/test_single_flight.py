@@ -0,0 +1,88 @@
+"""
+SingleFlight tests: concurrent callers share one call, its result and its exception
+"""
+
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return b"image"
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert calls == 1
+    assert results == [b"image"] * 5
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+
+def test_different_keys_and_later_calls_run_separately():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch(key):
+            calls.append(key)
+            await asyncio.sleep(0)
+            return key
+
+        await asyncio.gather(flight.do("a", lambda: fetch("a")), flight.do("b", lambda: fetch("b")))
+        # A finished call is not cached
+        await flight.do("a", lambda: fetch("a"))
+        return calls
+
+    assert asyncio.run(scenario()) == ["a", "b", "a"]
+
+
+def test_exception_is_shared_by_all_callers():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(3)), return_exceptions=True)
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert calls == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "upstream failed" for r in results)
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.create_task(flight.do("key", fetch))
+        follower = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "done"
@@ -0,0 +1,132 @@
+"""
+Tracing tests: drive the HTTP server against the fake Azure service and
+check the exported span tree with an in-memory exporter
+"""
+
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("opentelemetry.sdk")
+pytest.importorskip("starlette")
+httpx = pytest.importorskip("httpx")
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from fake_azure import FakeAzure
+
+EXPORTER = InMemorySpanExporter()
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(EXPORTER))
+    trace.set_tracer_provider(provider)
+    # The server writes its log file under the working directory on import
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp("server"))
+        import mcp_server_http
+        yield mcp_server_http
+
+
+@pytest.fixture(autouse=True)
+def clear_spans():
+    EXPORTER.clear()
+
+
+def generate_request(request_id: int = 1) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": "generate_image", "arguments": {"prompt": "A red square", "size": "1024x1024"}}
+    }
+
+
+def call_server(server, monkeypatch, headers: dict[str, str]) -> tuple[FakeAzure, httpx.Response]:
+    """POST one generate_image call to the app, with Azure served by a fake on a free port"""
+    async def scenario():
+        fake = FakeAzure(noise_images=False)
+        async with fake.serve() as base_url:
+            monkeypatch.setenv("AZURE_BASE_URL", base_url)
+            monkeypatch.setenv("AZURE_API_KEY", "fake-api-key-0000")
+            monkeypatch.setenv("AZURE_DEPLOYMENT_NAME", "fake-deployment")
+            monkeypatch.delenv("AZURE_ENDPOINTS", raising=False)
+            transport = httpx.ASGITransport(app=server.create_app())
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=30) as client:
+                    response = await client.post("/", json=generate_request(), headers=headers)
+            finally:
+                await server.close_generator()
+        return fake, response
+
+    return asyncio.run(scenario())
+
+
+def spans_by_name():
+    spans = {}
+    for span in EXPORTER.get_finished_spans():
+        spans.setdefault(span.name, span)
+    return spans
+
+
+def assert_child_of(child, parent):
+    assert child.parent is not None, f"{child.name} has no parent"
+    assert child.parent.span_id == parent.context.span_id, f"{child.name} is not a child of {parent.name}"
+    assert child.context.trace_id == parent.context.trace_id
+
+
+def test_tool_call_span_tree_and_upstream_headers(server, monkeypatch):
+    fake, response = call_server(server, monkeypatch, {})
+
+    assert response.status_code == 200
+    assert any(part["type"] == "image" for part in response.json()["result"]["content"])
+
+    spans = spans_by_name()
+    root = spans["POST /"]
+    assert root.parent is None
+    assert root.kind == trace.SpanKind.SERVER
+    assert_child_of(spans["tools/call"], root)
+    assert_child_of(spans["tool generate_image"], spans["tools/call"])
+    assert_child_of(spans["azure generate"], spans["tool generate_image"])
+    upstream = spans["POST images/generations"]
+    assert_child_of(upstream, spans["azure generate"])
+    assert upstream.kind == trace.SpanKind.CLIENT
+    assert upstream.attributes["http.response.status_code"] == 200
+
+    # The fake saw the upstream span as its parent and the logged client request id
+    headers = fake.last_request_headers
+    version, trace_id, parent_id, flags = headers["traceparent"].split("-")
+    assert int(trace_id, 16) == root.context.trace_id
+    assert int(parent_id, 16) == upstream.context.span_id
+    assert headers["x-ms-client-request-id"] == upstream.attributes["azure.client_request_id"]
+
+
+def test_incoming_traceparent_is_continued(server, monkeypatch):
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    call_server(server, monkeypatch, {"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+
+    root = spans_by_name()["POST /"]
+    assert root.context.trace_id == int(trace_id, 16)
+    assert root.parent.span_id == int("00f067aa0ba902b7", 16)
+
+
+def test_streamed_call_runs_inside_server_span(server, monkeypatch):
+    fake, response = call_server(server, monkeypatch, {"Accept": "application/json, text/event-stream"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1]["id"] == 1 and "result" in events[-1]
+
+    spans = spans_by_name()
+    root = spans["POST /"]
+    tool = spans["tool generate_image"]
+    assert_child_of(spans["tools/call"], root)
+    assert_child_of(tool, spans["tools/call"])
+    # The server span stays open until the last event is sent
+    assert root.end_time >= tool.end_time
@@ -0,0 +1,162 @@
+"""
+Upload tests: POST /uploads limits and errors, expiry, and edit_image
+reading its input by upload_id over create_app()
+"""
+
+import asyncio
+import io
+
+import pytest
+
+from upload_store import UploadStore, UploadTooLargeError
+
+MAX_BYTES = 4096
+
+
+def png(size: int = 64) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def uploads(http_server, monkeypatch):
+    store = UploadStore(max_uploads=2, max_bytes=MAX_BYTES, spool_max_memory=100, ttl_seconds=60)
+    monkeypatch.setattr(http_server, "_upload_store", store)
+    yield store
+    store.close()
+
+
+async def chunks(data: bytes, chunk_size: int = 512):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+def edit_request(upload_id: str, request_id: int = 1) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": "edit_image", "arguments": {"upload_id": upload_id, "prompt": "Add a hat"}}
+    }
+
+
+def test_upload_and_delete(uploads, app_client):
+    data = png()
+
+    async def scenario():
+        async with app_client() as client:
+            created = await client.post("/uploads", content=data, headers={"Content-Type": "image/png"})
+            upload_id = created.json()["upload_id"]
+            stored = await uploads.read(upload_id)
+            deleted = await client.delete(f"/uploads/{upload_id}")
+            again = await client.delete(f"/uploads/{upload_id}")
+            return created, stored, deleted, again
+
+    created, stored, deleted, again = asyncio.run(scenario())
+    assert created.status_code == 201
+    summary = created.json()
+    assert summary["size"] == len(data) and summary["content_type"] == "image/png"
+    assert stored == data
+    assert deleted.status_code == 204 and again.status_code == 404
+    assert uploads.stats()["uploads"] == 0 and uploads.total_bytes == 0
+
+
+def test_oversized_upload_is_rejected_by_content_length(uploads, app_client):
+    async def scenario():
+        async with app_client() as client:
+            return await client.post("/uploads", content=b"x" * (MAX_BYTES + 1))
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 413
+    assert uploads.rejected == 1 and uploads.stats()["uploads"] == 0
+
+
+def test_oversized_upload_is_rejected_while_streaming(uploads, app_client):
+    async def scenario():
+        async with app_client() as client:
+            # A chunked body has no Content-Length, so the limit is enforced on the stream
+            return await client.post("/uploads", content=chunks(b"x" * (MAX_BYTES + 1)))
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 413
+    assert "4096 bytes" in response.json()["error"]
+    assert uploads.rejected == 1 and uploads.stats()["uploads"] == 0
+
+
+def test_multipart_and_empty_uploads_are_rejected(uploads, app_client):
+    async def scenario():
+        async with app_client() as client:
+            multipart = await client.post("/uploads", files={"image": ("image.png", png(), "image/png")})
+            empty = await client.post("/uploads", content=b"")
+            return multipart, empty
+
+    multipart, empty = asyncio.run(scenario())
+    assert multipart.status_code == 415
+    assert empty.status_code == 400
+    assert uploads.stats()["uploads"] == 0
+
+
+def test_full_store_answers_503(uploads, app_client):
+    async def scenario():
+        async with app_client() as client:
+            return [await client.post("/uploads", content=png()) for _ in range(3)]
+
+    responses = asyncio.run(scenario())
+    assert [response.status_code for response in responses] == [201, 201, 503]
+    assert responses[2].headers["retry-after"] == "1"
+    assert uploads.rejected == 1
+
+
+def test_edit_image_by_upload_id_reuses_the_upload(uploads, app_client):
+    async def scenario():
+        async with app_client() as client:
+            # Larger than spool_max_memory, so the upload is read back from disk
+            created = await client.post("/uploads", content=chunks(png(128)), headers={"Content-Type": "image/png"})
+            upload_id = created.json()["upload_id"]
+            first = await client.post("/", json=edit_request(upload_id, 1))
+            second = await client.post("/", json=edit_request(upload_id, 2))
+            return first.json(), second.json()
+
+    for response in asyncio.run(scenario()):
+        assert [part["type"] for part in response["result"]["content"]][-1] == "image"
+
+
+def test_expired_upload_cannot_be_edited(uploads, app_client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("upload_store.time.time", lambda: now[0])
+
+    async def scenario():
+        async with app_client() as client:
+            created = await client.post("/uploads", content=png())
+            upload_id = created.json()["upload_id"]
+            assert created.json()["expires_at"] == 1060.0
+            now[0] += 60
+            response = await client.post("/", json=edit_request(upload_id))
+            deleted = await client.delete(f"/uploads/{upload_id}")
+            return upload_id, response.json(), deleted
+
+    upload_id, response, deleted = asyncio.run(scenario())
+    (part,) = response["result"]["content"]
+    assert part["text"] == f"Unknown or expired upload_id: {upload_id}"
+    assert deleted.status_code == 404
+    assert uploads.stats() == {"uploads": 0, "max_uploads": 2, "bytes": 0, "rejected": 0}
+
+
+def test_spool_moves_to_disk_past_the_memory_limit():
+    async def scenario():
+        store = UploadStore(max_bytes=10_000, spool_max_memory=100)
+        small = await store.receive(chunks(b"a" * 50))
+        large = await store.receive(chunks(b"b" * 5000))
+        with pytest.raises(UploadTooLargeError):
+            await store.receive(chunks(b"c" * 10_001))
+        result = small.file._rolled, large.file._rolled, await store.read(large.id), store.total_bytes
+        store.close()
+        return result
+
+    small_rolled, large_rolled, data, total = asyncio.run(scenario())
+    assert not small_rolled and large_rolled
+    assert data == b"b" * 5000
+    assert total == 5050